@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# ==============================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+'''Read throughput of evedata.queries with per thread read-only connections
+
+    python3 benchmarks/concurrency.py --db resources/eve.db --threads 1 2 4 8
+'''
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="game DB to query (default: resources/eve.db)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=20000,
+        help="number of lookups per run")
+    args = parser.parse_args()
+
+    if args.db:
+        config.gameDB = args.db
+    config.defPaths()
+
+    from service.queryDB import EveDB
+    from evedata import queries
+
+    EveDB.setReadOnly()
+    systems = EveDB.getInstance().selectall("mapDenormalize",
+        ("itemID", "itemName"), {"groupID": 5})
+    random.seed(0)
+    lookups = [random.choice(systems) for _ in range(args.queries)]
+
+    def lookup(system):
+        queries.getMapNameFromId(system[0])
+        queries.getSystemIdFromName(system[1])
+        queries.getStationsFromSystemId(system[0])
+
+    print("{:>8} {:>12} {:>8}".format("threads", "lookups/s", "speedup"))
+    reference = None
+    for threads in args.threads:
+        with ThreadPoolExecutor(threads) as executor:
+            # Open the connection of each thread before timing
+            list(executor.map(lookup, lookups[:threads * 10]))
+            start = time.perf_counter()
+            list(executor.map(lookup, lookups))
+            elapsed = time.perf_counter() - start
+        EveDB.closeReaders()
+        throughput = len(lookups) / elapsed
+        reference = reference or throughput
+        print("{:>8} {:>12.0f} {:>7.2f}x".format(threads, throughput,
+            throughput / reference))
+
+
+if __name__ == "__main__":
+    main()
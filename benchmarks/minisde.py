@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# ==============================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+'''Synthetic SDE archive for the benchmarks, generated offline
+
+    python3 benchmarks/minisde.py sde.zip --scale 0.1
+
+Scale 1 has about the size of known space (68 regions, 1088 constellations,
+5440 systems, 40000 types).
+'''
+
+import argparse
+import random
+import zipfile
+
+import yaml
+
+try:
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
+
+UNIVERSE = "sde/fsd/universe/"
+REGIONS = 68
+CONSTELLATIONS_PER_REGION = 16
+SYSTEMS_PER_CONSTELLATION = 5
+TYPES = 40000
+CHARACTERS = 2000
+
+
+def _position(rnd, spread):
+    return [rnd.uniform(-spread, spread) for _ in range(3)]
+
+def _solarSystem(rnd, ids, names, solarSystemID):
+    # A system with 1 to 3 planets, some stations and moons
+    system = {
+        "solarSystemID": solarSystemID,
+        "center": _position(rnd, 1e17),
+        "security": round(rnd.uniform(-1, 1), 4),
+        "stargates": {},
+        "planets": {},
+    }
+    for index in range(rnd.randint(1, 3)):
+        planetID = ids["planet"]
+        ids["planet"] += 1
+        planet = {}
+        if rnd.random() < 0.4:
+            planet["npcStations"] = {ids["station"]: {
+                "position": _position(rnd, 1e12),
+                "ownerID": 1000000 + rnd.randint(1, 200),
+            }}
+            names.append({"itemID": ids["station"],
+                "itemName": "Station {} - Planet {}".format(ids["station"], index)})
+            ids["station"] += 1
+        if rnd.random() < 0.5:
+            moon = {}
+            if rnd.random() < 0.5:
+                moon["npcStations"] = {ids["station"]: {"position": _position(rnd, 1e12)}}
+                names.append({"itemID": ids["station"],
+                    "itemName": "Moon Station {}".format(ids["station"])})
+                ids["station"] += 1
+            planet["moons"] = {planetID + 500000: moon}
+        system["planets"][planetID] = planet
+        names.append({"itemID": planetID, "itemName": "Planet {}".format(planetID)})
+    return system
+
+def build(path, scale = 0.1, seed = 1):
+    '''Write a synthetic sde.zip
+
+    Args:
+        path (str): Path of the archive
+        scale (float - optionnal): Size relative to the real SDE
+        seed (int - optionnal): Seed of the generator, same seed same archive
+
+    Returns:
+        dict: The number of regions, constellations, systems and types
+    '''
+    rnd = random.Random(seed)
+    ids = {"station": 60000001, "planet": 40000001}
+    names = []
+    files = []
+    systems = []
+    regionCount = max(2, int(REGIONS * scale))
+    solarSystemID = 30000001
+    constellationID = 20000001
+    for region in range(regionCount):
+        regionID = 10000001 + region
+        regionPath = "{}eve/Region{:03d}".format(UNIVERSE, region)
+        regionData = {"regionID": regionID, "center": _position(rnd, 1e17)}
+        if region % 2:
+            regionData["factionID"] = 500001 + region
+        files.append((regionPath + "/region.staticdata", regionData))
+        names.append({"itemID": regionID, "itemName": "Region {}".format(region)})
+        for constellation in range(CONSTELLATIONS_PER_REGION):
+            constellationPath = "{}/Cons{:02d}".format(regionPath, constellation)
+            files.append((constellationPath + "/constellation.staticdata", {
+                "constellationID": constellationID,
+                "center": _position(rnd, 1e17),
+            }))
+            names.append({"itemID": constellationID,
+                "itemName": "Cons {}-{}".format(region, constellation)})
+            for system in range(SYSTEMS_PER_CONSTELLATION):
+                systemData = _solarSystem(rnd, ids, names, solarSystemID)
+                files.append(("{}/Sys{:02d}/solarsystem.staticdata".format(
+                    constellationPath, system), systemData))
+                names.append({"itemID": solarSystemID,
+                    "itemName": "Sys {}-{}-{}".format(region, constellation, system)})
+                systems.append(systemData)
+                solarSystemID += 1
+            constellationID += 1
+    # A chain through all the systems plus as many random gates
+    edges = {(index - 1, index) for index in range(1, len(systems))}
+    for _ in range(len(systems)):
+        a, b = rnd.sample(range(len(systems)), 2)
+        edges.add((min(a, b), max(a, b)))
+    stargateID = 50000001
+    for a, b in sorted(edges):
+        systems[a]["stargates"][stargateID] = {"destination": stargateID + 1, "typeID": 16}
+        systems[b]["stargates"][stargateID + 1] = {"destination": stargateID, "typeID": 16}
+        stargateID += 2
+    # Wormhole space is skipped by the build
+    files.append((UNIVERSE + "wormhole/WRegion/region.staticdata",
+        {"regionID": 11000001, "center": [0, 0, 0]}))
+    for character in range(int(CHARACTERS * scale) + 50):
+        names.append({"itemID": 1000 + character, "itemName": "Char {}".format(character)})
+    types = {}
+    for typeID in range(1, int(TYPES * scale) + 21):
+        typeData = {
+            "name": {"en": "Type {}".format(typeID), "de": "Typ {}".format(typeID)},
+            "volume": rnd.random() * 10,
+        }
+        if typeID % 2:
+            typeData["marketGroupID"] = 100 + typeID % 7
+            typeData["description"] = {"en": "Description of type {}".format(typeID)}
+        types[typeID] = typeData
+    files.append(("sde/fsd/typeIDs.yaml", types))
+    rnd.shuffle(names)
+    files.append(("sde/bsd/invNames.yaml", names))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, yaml.dump(data, Dumper=Dumper))
+    return {
+        "regions": regionCount,
+        "constellations": regionCount * CONSTELLATIONS_PER_REGION,
+        "systems": len(systems),
+        "types": len(types),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(build(args.path, args.scale, args.seed))
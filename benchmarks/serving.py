@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# ==============================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+'''Query latency and memory of the serving modes of EveDB
+
+    python3 benchmarks/serving.py --db resources/eve.db --processes 4
+
+Each mode runs in fresh processes started together: "cold" is the first
+query of a process (connection and, in memory mode, the load of the DB
+included), "warm" the next lookups. The OS page cache is not dropped.
+'''
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+
+
+def _memory():
+    # Resident, private and shared memory of the process in MB (Linux)
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_mb": round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 2)}
+    return {
+        "rss_mb": round(fields.get("Rss", 0), 2),
+        "private_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 2),
+        "shared_mb": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 2),
+    }
+
+def child(mode, queries, seed):
+    from service.queryDB import EveDB
+    from evedata import queries as evequeries
+
+    before = _memory()
+    start = time.perf_counter()
+    EveDB.setServingMode(mode)
+    eveDB = EveDB.getInstance()
+    itemIDs = [row[0] for row in eveDB.selectall("mapDenormalize", ("itemID",))]
+    cold = time.perf_counter() - start
+    rnd = random.Random(seed)
+    durations = []
+    for itemID in (rnd.choice(itemIDs) for _ in range(queries)):
+        start = time.perf_counter()
+        evequeries.getMapNameFromId(itemID)
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    result = {
+        "cold_ms": round(cold * 1000, 3),
+        "warm_p50_us": round(durations[len(durations) // 2] * 1e6, 2),
+        "warm_p99_us": round(durations[int(len(durations) * 0.99)] * 1e6, 2),
+        "before": before,
+        "after": _memory(),
+    }
+    print(json.dumps(result))
+
+def run(mode, args):
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode,
+        "--queries", str(args.queries)]
+    if args.db:
+        command += ["--db", args.db]
+    processes = [subprocess.Popen(command + ["--seed", str(seed)],
+            stdout=subprocess.PIPE, universal_newlines=True)
+        for seed in range(args.processes)]
+    results = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode:
+            raise RuntimeError("{} mode failed".format(mode))
+        results.append(json.loads(output))
+    summary = {"processes": len(results)}
+    for key in ("cold_ms", "warm_p50_us", "warm_p99_us"):
+        summary[key] = round(statistics.mean(result[key] for result in results), 3)
+    for key in results[0]["after"]:
+        summary["delta_" + key] = round(statistics.mean(
+            result["after"][key] - result["before"].get(key, 0) for result in results), 2)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="game DB to query (default: resources/eve.db)")
+    parser.add_argument("--modes", nargs="+", default=["default", "mmap", "memory"])
+    parser.add_argument("--processes", type=int, default=4,
+        help="processes started together per mode")
+    parser.add_argument("--queries", type=int, default=20000,
+        help="lookups per process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        config.gameDB = args.db or os.path.join(ROOT, "resources", "eve.db")
+        child(args.child, args.queries, args.seed)
+        return
+    print(json.dumps({mode: run(mode, args) for mode in args.modes}, indent=1))
+
+
+if __name__ == "__main__":
+    main()
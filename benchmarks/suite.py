@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# ==============================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+'''Build a DB from a synthetic SDE and time the build phases and the queries
+
+    python3 benchmarks/suite.py --scale 0.1 --output results.json
+
+Runs offline, the results are JSON (stdout by default), the build logs go to
+stderr.
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+import minisde
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _percentile(durations, percent):
+    return durations[min(len(durations) - 1, int(len(durations) * percent / 100))]
+
+def _typo(rnd, name):
+    # Swap two neighbour characters
+    index = rnd.randrange(len(name) - 1)
+    return name[:index] + name[index + 1] + name[index] + name[index + 2:]
+
+def timeCalls(function, arguments):
+    '''Call function once per item of arguments
+
+    Returns:
+        dict: calls, calls per second and latency percentiles in microseconds
+    '''
+    durations = []
+    clock = time.perf_counter
+    for argument in arguments:
+        start = clock()
+        function(*argument)
+        durations.append(clock() - start)
+    total = sum(durations)
+    durations.sort()
+    return {
+        "calls": len(durations),
+        "per_second": round(len(durations) / total, 1) if total else None,
+        "p50_us": round(_percentile(durations, 50) * 1e6, 2),
+        "p99_us": round(_percentile(durations, 99) * 1e6, 2),
+        "max_us": round(durations[-1] * 1e6, 2),
+    }
+
+def benchQueries(count, seed):
+    # Lookups with random keys of the built DB
+    from evedata import queries
+    from service.queryDB import EveDB
+
+    eveDB = EveDB.getInstance()
+    rnd = random.Random(seed)
+    systems = [tuple(row) for row in eveDB.selectall("mapDenormalize",
+        ("itemID", "itemName", "regionID"), {"groupID": 5})]
+    types = [tuple(row) for row in eveDB.selectall("invTypes", ("typeID", "typeName"))]
+    picked = [rnd.choice(systems) for _ in range(count)]
+    batches = max(1, count // 100)
+
+    benchmarks = {
+        "select": (lambda itemID: eveDB.selectone("mapDenormalize",
+                where={"itemID": itemID}),
+            [(system[0],) for system in picked]),
+        "getMapNameFromId": (queries.getMapNameFromId,
+            [(system[0],) for system in picked]),
+        "getMapIdFromName": (queries.getMapIdFromName,
+            [(system[1],) for system in picked]),
+        "getSystemIdFromName": (queries.getSystemIdFromName,
+            [(system[1],) for system in picked]),
+        "getStationsFromSystemId": (queries.getStationsFromSystemId,
+            [(system[0],) for system in picked]),
+        "getRegionsAround": (queries.getRegionsAround,
+            [(system[2],) for system in picked]),
+        "getMapNamesFromIds": (queries.getMapNamesFromIds,
+            [([system[0] for system in rnd.sample(systems, min(100, len(systems)))],)
+                for _ in range(batches)]),
+        "getSystemsWithinRadius": (queries.getSystemsWithinRadius,
+            [(system[0], 10) for system in picked[:count // 10 or 1]]),
+        "getClosestStations": (queries.getClosestStations,
+            [(system[0], 3) for system in picked[:count // 10 or 1]]),
+        "searchNames": (queries.searchNames,
+            [(system[1][:rnd.randint(1, len(system[1]))],)
+                for system in picked[:count // 10 or 1]]),
+        "fuzzySearchNames": (queries.fuzzySearchNames,
+            [(_typo(rnd, rnd.choice(types)[1]),) for _ in range(count // 100 or 1)]),
+    }
+    return {name: timeCalls(function, arguments)
+        for name, (function, arguments) in benchmarks.items()}
+
+def benchLoad(count, threads, seed):
+    # select throughput with per thread read-only connections
+    from service.queryDB import EveDB
+
+    EveDB.setReadOnly()
+    try:
+        systemIDs = [row[0] for row in EveDB.getInstance().selectall(
+            "mapDenormalize", ("itemID",), {"groupID": 5})]
+        rnd = random.Random(seed)
+        lookups = [rnd.choice(systemIDs) for _ in range(count)]
+
+        def lookup(itemID):
+            EveDB.getInstance().selectone("mapDenormalize", where={"itemID": itemID})
+
+        results = {}
+        for threadCount in threads:
+            with ThreadPoolExecutor(threadCount) as executor:
+                list(executor.map(lookup, lookups[:threadCount * 10]))
+                start = time.perf_counter()
+                list(executor.map(lookup, lookups))
+                elapsed = time.perf_counter() - start
+            EveDB.closeReaders()
+            results[str(threadCount)] = round(count / elapsed, 1)
+        return results
+    finally:
+        EveDB.setReadOnly(False)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.1,
+        help="size of the synthetic SDE relative to the real one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int,
+        help="processes of the build (default: CPU count)")
+    parser.add_argument("--profile", default="bulk", help="build profile")
+    parser.add_argument("--no-jump-matrix", dest="jump_matrix", action="store_false")
+    parser.add_argument("--queries", type=int, default=5000,
+        help="calls per query benchmark")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--workdir", help="keep the SDE and the DB there "
+        "(default: a temporary directory)")
+    parser.add_argument("--output", help="write the JSON results there")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(workdir, exist_ok=True)
+        sdePath = os.path.join(workdir, "sde.zip")
+        config.gameDB = os.path.join(workdir, "eve.db")
+
+        from evedata import create_db
+        from service.queryDB import EveDB
+
+        start = time.perf_counter()
+        sizes = minisde.build(sdePath, args.scale, args.seed)
+        generated = time.perf_counter() - start
+        with contextlib.redirect_stdout(sys.stderr):
+            build = create_db(sdePath=sdePath, workers=args.workers,
+                profile=args.profile, force=True, jumpMatrix=args.jump_matrix)
+        results = {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scale": args.scale,
+            "sde": dict(sizes, generate_s=round(generated, 3),
+                bytes=os.path.getsize(sdePath)),
+            "build": {phase: round(duration, 4) for phase, duration in build.items()},
+            "db_bytes": os.path.getsize(config.gameDB),
+            "queries": benchQueries(args.queries, args.seed),
+            "load": benchLoad(args.queries, args.threads, args.seed),
+        }
+        EveDB.reset()
+
+    output = json.dumps(results, indent=1)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import os
 import sys
-import yaml
 
 pyttPath = None
 gameDB = None
@@ -20,17 +20,57 @@
 # ==============================================================================
 
 
+import argparse
 import sys
 
 from config import defPaths
-from evedata import create_db
+from evedata import BUILD_PROFILES, create_db
+from evedata.report import PROFILERS
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Build the pytt DB from the EVE SDE")
+    parser.add_argument("--sde", metavar="PATH",
+        help="use a pre-fetched sde.zip instead of downloading it "
+        "(its modification time is used as SDE version)")
+    parser.add_argument("--chunk-size", metavar="ROWS", type=int,
+        help="number of rows inserted per executemany")
+    parser.add_argument("--profile", choices=sorted(BUILD_PROFILES), default="bulk",
+        help="SQLite tuning used while building (default: bulk)")
+    parser.add_argument("--workers", metavar="N", type=int,
+        help="number of processes parsing the regions (default: CPU count)")
+    parser.add_argument("--invnames", action="store_true",
+        help="keep the invNames table in the DB")
+    parser.add_argument("--incremental", action="store_true",
+        help="only re-import the parts of the SDE which changed since the "
+        "previous incremental build")
+    parser.add_argument("--url", help="where sde.zip is downloaded from")
+    parser.add_argument("--force", action="store_true",
+        help="build even if sde.zip did not change since the last build")
+    parser.add_argument("--no-jump-matrix", dest="jump_matrix", action="store_false",
+        help="do not precompute the jumps between all known space systems")
+    parser.add_argument("--export", action="store_true",
+        help="also export invTypes, mapDenormalize and mapJumps as .npy "
+        "columns next to the DB")
+    parser.add_argument("--quiet", action="store_true",
+        help="do not print each imported region, system and station")
+    parser.add_argument("--profiler", choices=PROFILERS,
+        help="profile the build, the results are saved next to the DB")
+    parser.add_argument("--compact", action="store_true",
+        help="leave the type descriptions empty and skip the indexes not "
+        "used by evedata.queries")
+    parser.add_argument("--artifact", action="store_true",
+        help="also write eve.db.xz and its manifest for distribution")
+    args = parser.parse_args()
+
     print("Starting pytt DB creation")
     defPaths()
 
-    create_db()
+    create_db(sdePath=args.sde, chunkSize=args.chunk_size, profile=args.profile,
+        workers=args.workers, invNames=args.invnames, incremental=args.incremental,
+        url=args.url, force=args.force, jumpMatrix=args.jump_matrix,
+        export=args.export, quiet=args.quiet, profiler=args.profiler,
+        compact=args.compact, artifact=args.artifact)
     sys.exit()
 
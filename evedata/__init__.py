@@ -19,226 +19,544 @@
 #======================================================================
 
 
+# Only what evedata.queries and the other read-only modules need is imported
+# here, the build dependencies are imported by create_db
 import os
 import os.path
-import sys
-import requests
-from io import BytesIO
-
-from dateutil.parser import parse
+from contextlib import contextmanager
 
 from config import getGameDB
-from service.queryDB import EveDB
-from evedata.tables import eveTables
 
 SDE_LINK = "https://eve-static-data-export.s3-eu-west-1.amazonaws.com/tranquility/sde.zip"
+SDE_FILE = "sde.zip"
+# PRAGMA applied before creating the tables of the game DB.
+# The DB is rebuilt from scratch so durability is useless while building.
+BUILD_PROFILES = {
+    "default": [],
+    "bulk": [
+        "PRAGMA journal_mode = OFF",
+        "PRAGMA synchronous = OFF",
+        "PRAGMA cache_size = -262144",
+        "PRAGMA temp_store = MEMORY",
+    ],
+}
+# Version of the rows built from the SDE, bump it when evedata.universe or
+# iterTypes change what they produce so incremental builds start over
+BUILD_VERSION = 2
+# Prefixes of the metadata fields describing the SDE of an incremental build
+MEMBER_FIELD = "member:"
+REGION_FIELD = "region:"
 language = "en"
 sdeVersion = None
 gameDB = None
 
 
-def create_db():
+def _buildIndexes(compact):
+    '''Indexes of the game DB, without compactSkippedIndexes when compact'''
+    from evedata.tables import compactSkippedIndexes, eveIndexes
+
+    if not compact:
+        return eveIndexes
+    return [index for index in eveIndexes
+        if not any('"{}"'.format(name) in index for name in compactSkippedIndexes)]
+
+
+def _schemaHash(invNames, compact):
+    '''Fingerprint of the statements and of the version building the game DB'''
+    import hashlib
+
+    from evedata.tables import (eveTables, hierarchyInserts, invNamesTable,
+        mapJumpsInsert, searchNamesInsert, searchTrigramTable,
+        spatialIndexInsert)
+
+    statements = eveTables + _buildIndexes(compact) + hierarchyInserts + [
+        mapJumpsInsert, spatialIndexInsert, searchTrigramTable, searchNamesInsert]
+    if invNames:
+        statements.append(invNamesTable)
+    if compact:
+        # invTypes descriptions are dropped
+        statements.append("compact")
+    statements.append("build_version {}".format(BUILD_VERSION))
+    return hashlib.sha1("\n".join(statements).encode()).hexdigest()
+
+
+def create_db(sdePath = None, chunkSize = None, profile = "bulk", workers = None,
+        invNames = False, incremental = False, url = None, force = False,
+        jumpMatrix = True, export = False, quiet = False, profiler = None,
+        compact = False, artifact = False):
+    '''Build the game DB from the SDE
+
+    Args:
+        sdePath (str - optionnal): Path of a pre-fetched sde.zip, the
+            archive is downloaded next to the game DB otherwise
+        chunkSize (int - optionnal): Number of rows inserted per executemany
+        profile (str - optionnal): A key of BUILD_PROFILES, with "bulk"
+            indexes are built once the tables are populated
+        workers (int - optionnal): Number of processes parsing the regions,
+            1 parses them in the current process, default to the CPU count
+        invNames (bool - optionnal): Keep the invNames table in the DB
+        incremental (bool - optionnal): Only re-import the members of the
+            SDE which changed since the previous incremental build, fall
+            back to a full build when there is none or the schema changed
+        url (str - optionnal): Where the SDE is downloaded from, SDE_LINK
+            by default
+        force (bool - optionnal): Build even if the downloaded SDE did not
+            change since the build of the game DB
+        jumpMatrix (bool - optionnal): Precompute the jumps between all
+            known space systems next to the game DB (see evedata.jumps)
+        export (bool - optionnal): Export invTypes, mapDenormalize and
+            mapJumps as memory mappable columns (see evedata.columnar)
+        quiet (bool - optionnal): Do not print each imported item
+        profiler (str - optionnal): "cprofile" dumps the stats of the build
+            next to the game DB (.build.prof), "tracemalloc" adds the top
+            allocations to the report
+        compact (bool - optionnal): Leave the invTypes descriptions empty
+            and skip the indexes not used by evedata.queries
+        artifact (bool - optionnal): Compress the game DB for distribution
+            (see evedata.artifact)
+
+    Returns:
+        dict: The duration in seconds of each phase of the build
+
+    Notes:
+        A report with the wall/CPU time, the YAML/SQL split and the rows
+        per second of each phase is saved next to the game DB (.build.json).
+    '''
     global gameDB
 
+    import sqlite3
+    from multiprocessing import Pool
     from zipfile import ZipFile
 
-    import yaml
-    try:
-        from yaml import CLoader as Loader
-        print('Using CLoader')
-    except ImportError:
-        from yaml import Loader
-        print('Using Python Loader')
+    import requests
+
+    from evedata.download import DownloadError, ResourcesCache
+    from evedata.names import NameIndex
+    from evedata.report import (PROFILERS, BuildReport, peakRSS, profiled,
+        reportPath)
+    from evedata.sde import (INV_NAMES, TYPE_IDS, Loader, iterYaml,
+        memberManifest, regionDir)
+    from evedata.tables import (danglingStargates, eveTables,
+        hierarchyInserts, hierarchyTables, invNamesTable, mapJumpsInsert,
+        searchNamesInsert, searchTrigramTable, spatialIndexInsert)
+    from evedata.universe import (DENORMALIZE_COLUMNS, STARGATES_COLUMNS,
+        initParser, parseRegion)
+    from service.queryDB import BulkInsert, EveDB
+    print('Using {}'.format(
+        'CLoader' if Loader.__name__ == 'CLoader' else 'Python Loader'))
 
     gameDB = getGameDB()
     resourcesZip = None
+    resourcesPath = None
+    upToDate = False
+    names = None
+    bulk = None
+    # Region directory of the SDE -> regionID
+    regionIDs = {}
+    if not workers:
+        workers = os.cpu_count() or 1
     eveDB = EveDB.getInstance()
 
-    def _readYaml(file):
-        return yaml.load(resourcesZip.read(file), Loader = Loader)
+    timings = {}
+    report = BuildReport()
+
+    @contextmanager
+    def timed(phase):
+        with report.phase(phase):
+            yield
+        timings[phase] = report.wall(phase)
+        print("{} done in {:.2f} s".format(phase, timings[phase]))
+
+    def _iterYaml(file):
+        return iterYaml(resourcesZip, file)
 
     def _getFileList(path, zone):
         return [x for x in resourcesZip.namelist() if path in x and zone in x]
 
+    def builtVersion():
+        # dump_time of the existing game DB
+        try:
+            return eveDB.dumpTime()
+        except sqlite3.DatabaseError:
+            return None
+
     def getResourcesFile():
         nonlocal resourcesZip
+        nonlocal resourcesPath
+        nonlocal upToDate
         global sdeVersion
-        print("Downloading resources file from EVE")
-        resourcesFile = requests.get(SDE_LINK)
-        if resourcesFile.ok:
-            resourcesZip = ZipFile(BytesIO(resourcesFile.content))
-            sdeVersion = int(parse(resourcesFile.headers["Last-Modified"]).timestamp())
-            print("sdeVersion : {}".format(sdeVersion))
-            return True
+        if sdePath:
+            if not os.path.isfile(sdePath):
+                print("Resources file {} not found".format(sdePath))
+                return False
+            print("Using local resources file {}".format(sdePath))
+            path = sdePath
+            sdeVersion = int(os.path.getmtime(path))
         else:
-            print("Not able to download resources file from EVE")
-            return False
+            path = os.path.join(os.path.dirname(gameDB), SDE_FILE)
+            cache = ResourcesCache(url or SDE_LINK, path)
+            print("Downloading resources file from EVE")
+            try:
+                downloaded = cache.fetch()
+            except (requests.RequestException, DownloadError) as error:
+                print("Not able to download resources file from EVE: {}".format(error))
+                return False
+            sdeVersion = cache.sdeVersion
+            if not downloaded:
+                print("Resources file unchanged since last download")
+                if not force and sdeVersion and builtVersion() == sdeVersion:
+                    print("Game DB already built from SDE {}".format(sdeVersion))
+                    upToDate = True
+                    return True
+        resourcesZip = ZipFile(path)
+        resourcesPath = path
+        print("sdeVersion : {}".format(sdeVersion))
+        return True
 
     def populate():
 
-        print("Populating invNames")
-        eveDB.insertmany("invNames",
-            ("itemID", "itemName"),
-            (_readYaml('sde/bsd/invNames.yaml'))
-        )
+        popNames(invNames)
 
-        print("Populating invTypes")
-        for typeID, typeData in _readYaml('sde/fsd/typeIDs.yaml').items():
-            if (typeData.get("marketGroupID")):
-                description = typeData.get('description', {}).get(language, '')
-                description.replace('"', r'\"')
-                eveDB.insert("invTypes",
-                    ("typeID", "typeName", "description", "volume"),
-                    (typeID, typeData.get('name', {}).get(language, ''),
-                        description,
-                        typeData.get('volume', 0)
-                    )
-                )
-        
-        print("Populating mapDenormalize")
-        for regionFile in _getFileList('/eve', 'region'):
-            popRegion(regionFile)
+        with timed("invTypes"):
+            print("Populating invTypes")
+            eveDB.insertmany("invTypes",
+                ("typeID", "typeName", "description", "volume"),
+                iterTypes()
+            )
+            report.addRows("invTypes", eveDB.cursor.rowcount)
+
+        with timed("mapDenormalize"):
+            print("Populating mapDenormalize")
+            popUniverse(_getFileList('/eve', 'region'))
+            bulk.flush()
         
+        popMetadata()
+
+        with timed("mapJumps"):
+            popMapJumps()
+
+        with timed("hierarchy"):
+            popHierarchy()
+
+        with timed("spatialIndex"):
+            popSpatialIndex()
+
+        with timed("searchIndex"):
+            popSearchIndex()
+
+        eveDB.commit()
+
+    def popNames(store):
+        nonlocal names
+        with timed("invNames"):
+            print("Indexing invNames")
+            names = NameIndex(iterNames(store))
+            print("    {} map names indexed".format(len(names)))
+            bulk.flush()
+
+    def popMetadata():
         print("Populating metadata")
         print("sdeVersion : {}".format(sdeVersion))
         eveDB.insert("metadata",
             ("field_name", "field_value"),
             ("dump_time", sdeVersion)
         )
-
-        popMapJumps()
-
-        eveDB.commit()
-
-    def popRegion(regionFile):
-        head, _ = os.path.split(regionFile)
-        region = _readYaml(regionFile)
-        regionName = eveDB.selectone("invNames",
-            where={"itemID": region['regionID']}
-        )["itemName"]
-        print("    Importing Region {}".format(regionName))
-        eveDB.insert("mapDenormalize",
-            ("itemID", "groupID", "x", "y", "z", "itemName", "factionID"),
-            (region['regionID'], 3, region['center'][0], region['center'][1],
-                region['center'][2], regionName, region.get('factionID', None)
-            )
-        )
-        for constellationFile in _getFileList(head, 'constellation'):
-            popConstellation(constellationFile, region)
-
-    def popConstellation(constellationFile, region):
-        head, _ = os.path.split(constellationFile)
-        constellation = _readYaml(constellationFile)
-
-        constellationName = eveDB.selectone("invNames",
-            where={"itemID": constellation["constellationID"]}
-        )["itemName"]
-        print("        Importing constellation {}".format(constellationName))
-        eveDB.insert("mapDenormalize",
-            ("itemID", "groupID", "regionID", "x", "y", "z", "itemName", "factionID"),
-            (constellation["constellationID"], 4, region['regionID'], 
-                constellation['center'][0], constellation['center'][1],
-                constellation['center'][2], constellationName,
-                constellation.get('factionID', region.get('factionID', None))
-            )
-        )
-        for systemFile in _getFileList(head, 'solarsystem'):
-            popSolarSystem(systemFile, constellation, region)
-
-    def popSolarSystem(systemFile, constellation, region):
-        system = _readYaml(systemFile)
-        systemName = eveDB.selectone("invNames",
-            where={"itemID": system['solarSystemID']}
-        )["itemName"]
-        print("            Importing solar system {}".format(systemName))
-        eveDB.insert("mapDenormalize",
-            ("itemID", "groupID", "constellationID", "regionID", "x", "y", "z",
-                "itemName", "factionID"),
-            (system['solarSystemID'], 5, constellation["constellationID"], 
-                region['regionID'], system['center'][0], system['center'][1],
-                system['center'][2], systemName,
-                system.get('factionID', constellation.get('factionID', region.get('factionID', None)))
+        if incremental:
+            eveDB.insert("metadata",
+                ("field_name", "field_value"),
+                ("schema_hash", _schemaHash(invNames, compact))
             )
-        )
-        popStargates(system['stargates'], system, constellation, region)
-
-        for _, planetData in system['planets'].items():
-            if 'npcStations' in planetData:
-                popStation(planetData['npcStations'], system, constellation, region)
-            if 'moons' in planetData:
-                for _, moonData in planetData['moons'].items():
-                    if 'npcStations' in moonData:
-                        popStation(moonData['npcStations'], system, constellation, region)
-
-    def popStargates(stargates, system, constellation, region):
-        print("                Populating mapStargates and mapDenormalize")
-        for stargateID, stargateInfo in stargates.items():
-            eveDB.insert("mapStargates",
-                ("entranceID", "exitID"),
-                (stargateID, stargateInfo.get('destination'))
-            )
-            eveDB.insert("mapDenormalize",
-                ("itemID", "groupID", "solarSystemID", "constellationID", "regionID"),
-                (stargateID, 10, system["solarSystemID"],
-                    constellation["constellationID"], region["regionID"]
+            for member, value in memberManifest(resourcesZip).items():
+                bulk.add("metadata", ("field_name", "field_value"),
+                    (MEMBER_FIELD + member, value)
                 )
-            )
+            for directory, regionID in regionIDs.items():
+                bulk.add("metadata", ("field_name", "field_value"),
+                    (REGION_FIELD + directory, regionID)
+                )
+            bulk.flush()
+
+    def iterNames(store):
+        # Rows are only stored in invNames when the table is empty
+        for row in report.iterate(_iterYaml(INV_NAMES)):
+            if store:
+                bulk.add("invNames", ("itemID", "itemName"),
+                    (row["itemID"], row["itemName"])
+                )
+                report.addRows("invNames", 1)
+            yield row["itemID"], row["itemName"]
 
-    def popStation(stationData, system, constellation, region):
-        for stationID, stationInfo in stationData.items():
-            stationName = eveDB.selectone("invNames",
-            where={"itemID": stationID}
-            )["itemName"]
-            print("                Importing station {}".format(stationName))
-            eveDB.insert("mapDenormalize",
-                ("itemID", "groupID", "solarSystemID", "constellationID", "regionID",
-                    "x", "y", "z", "itemName", "security", "factionID", "corporationID"),
-                (stationID, 15, system['solarSystemID'], constellation["constellationID"],
-                    region['regionID'], stationInfo['position'][0],
-                    stationInfo['position'][1], stationInfo['position'][2],
-                    stationName, system['security'],
-                    system.get('factionID', constellation.get('factionID', region.get('factionID', None))),
-                    stationInfo.get('ownerID', None)
+    def iterTypes():
+        for typeID, typeData in report.iterate(_iterYaml(TYPE_IDS)):
+            if (typeData.get("marketGroupID")):
+                description = None
+                if not compact:
+                    description = typeData.get('description', {}).get(language, '')
+                    description.replace('"', r'\"')
+                yield (typeID, typeData.get('name', {}).get(language, ''),
+                    description,
+                    typeData.get('volume', 0)
                 )
-            )
+
+    def echoRows(rows):
+        # Progress is printed by the writer as rows may come from workers
+        if quiet:
+            return
+        for row in rows:
+            if row[1] == 3:
+                print("    Importing Region {}".format(row[8]))
+            elif row[1] == 4:
+                print("        Importing constellation {}".format(row[8]))
+            elif row[1] == 5:
+                print("            Importing solar system {}".format(row[8]))
+                print("                Populating mapStargates and mapDenormalize")
+            elif row[1] == 15:
+                print("                Importing station {}".format(row[8]))
+
+    def popUniverse(regionFiles):
+        if workers == 1 or len(regionFiles) < 2:
+            initParser(resourcesPath, names)
+            regions = map(parseRegion, regionFiles)
+            popRegions(regionFiles, report.iterate(regions))
+        else:
+            # Regions are parsed by the pool while this process writes them,
+            # imap keeps the order of the sequential build
+            with Pool(workers, initParser, (resourcesPath, names)) as pool:
+                popRegions(regionFiles,
+                    report.iterate(pool.imap(parseRegion, regionFiles)))
+
+    def popRegions(regionFiles, regions):
+        for regionFile, (denormalize, stargates, parseTime) in zip(regionFiles, regions):
+            # The region itself is the first row
+            regionIDs[regionDir(regionFile)] = denormalize[0][0]
+            report.workerParse += parseTime
+            report.addRows("mapDenormalize", len(denormalize))
+            report.addRows("mapStargates", len(stargates), "mapDenormalize")
+            echoRows(denormalize)
+            for row in denormalize:
+                bulk.add("mapDenormalize", DENORMALIZE_COLUMNS, row)
+            for row in stargates:
+                bulk.add("mapStargates", STARGATES_COLUMNS, row)
+
+    def popHierarchy():
+        print("Populating region and constellation jumps, stations per location")
+        for table, insert in zip(hierarchyTables, hierarchyInserts):
+            eveDB.execute("DELETE FROM {}".format(table))
+            eveDB.execute(insert)
+            report.addRows(table, eveDB.cursor.rowcount, "hierarchy")
+
+    def popSpatialIndex():
+        print("Populating mapSolarSystemsRTree")
+        eveDB.execute("DELETE FROM mapSolarSystemsRTree")
+        eveDB.execute(spatialIndexInsert)
+        report.addRows("mapSolarSystemsRTree", eveDB.cursor.rowcount, "spatialIndex")
+
+    def popSearchIndex():
+        print("Populating searchNames")
+        eveDB.execute("DELETE FROM searchNames")
+        eveDB.execute(searchNamesInsert)
+        print("    {} names".format(eveDB.cursor.rowcount))
+        report.addRows("searchNames", eveDB.cursor.rowcount, "searchIndex")
+        try:
+            eveDB.create(searchTrigramTable)
+        except sqlite3.OperationalError as error:
+            print("    No fuzzy search index ({})".format(error))
+            fts = ("searchNamesFTS",)
+        else:
+            fts = ("searchNamesFTS", "searchNamesTrigram")
+        for table in fts:
+            eveDB.execute(
+                'INSERT INTO "{0}" ("{0}") VALUES (\'rebuild\')'.format(table))
 
     def popMapJumps():
         print("Populating mapJumps")
-        stargateJumps = eveDB.selectall("mapStargates")
-        for jump in stargateJumps:
-            stargateEntrance = eveDB.selectone("mapDenormalize",
-                where={"itemID":jump["entranceID"]}
-            )
-            stargateExit = eveDB.selectone("mapDenormalize",
-                where={"itemID": jump["exitID"]}
-            )
-            eveDB.insert("mapJumps",
-                ("fromRegionID", "fromConstellationID", "fromSolarSystemID", 
-                "toSolarSystemID", "toConstellationID", "toRegionID"),
-                (stargateEntrance["regionID"], stargateEntrance["constellationID"],
-                    stargateEntrance["solarSystemID"], stargateExit["solarSystemID"],
-                    stargateExit["constellationID"], stargateExit["regionID"]
-                )
-            )
+        eveDB.execute(mapJumpsInsert)
+        print("    {} jumps".format(eveDB.cursor.rowcount))
+        report.addRows("mapJumps", eveDB.cursor.rowcount)
+        dangling = eveDB.execute(danglingStargates).fetchall()
+        for entranceID, exitID in dangling:
+            print("    Stargate {} leads to unknown stargate {}".format(entranceID, exitID))
+        if dangling:
+            print("    {} dangling stargates skipped".format(len(dangling)))
+        return dangling
+
+    def diffResources():
+        # Return the members changed since the previous incremental build
+        # or None when a full build is needed
+        tables = {row[0] for row in eveDB.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"metadata", "mapStargates"} <= tables:
+            print("No previous incremental build, full build needed")
+            return None
+        metadata = dict(eveDB.execute(
+            "SELECT field_name, field_value FROM metadata").fetchall())
+        if metadata.get("schema_hash") != _schemaHash(invNames, compact):
+            print("Schema of the game DB changed, full build needed")
+            return None
+        previous = {}
+        for field, value in metadata.items():
+            if field.startswith(MEMBER_FIELD):
+                previous[field[len(MEMBER_FIELD):]] = value
+            elif field.startswith(REGION_FIELD):
+                regionIDs[field[len(REGION_FIELD):]] = int(value)
+        current = memberManifest(resourcesZip)
+        return {member for member in previous.keys() | current.keys()
+            if previous.get(member) != current.get(member)}
+
+    def setupDB():
+        eveDB.execute("PRAGMA page_size = 4096")
+        for pragma in BUILD_PROFILES[profile]:
+            eveDB.execute(pragma)
 
-    if os.path.isfile(gameDB):
+    def buildDB():
+        nonlocal eveDB
+        nonlocal bulk
         eveDB.close()
-        os.remove(gameDB)
-    if getResourcesFile():    
-        print("Creating game DB")
+        if os.path.isfile(gameDB):
+            os.remove(gameDB)
+        print("Creating game DB ({} profile)".format(profile))
         eveDB = EveDB.getInstance()
-        eveDB.execute("PRAGMA page_size = 4096")
+        bulk = BulkInsert(eveDB, chunkSize)
+        setupDB()
         eveDB.create(eveTables)
+        if invNames:
+            eveDB.create(invNamesTable)
+        if not deferIndexes:
+            eveDB.create(eveIndexes)
 
         populate()
 
-        print("Cleaning game DB")
-        eveDB.drop("invNames")
-        eveDB.drop("mapStargates")
+        if not incremental:
+            # Stargates are needed to derive mapJumps of the next update
+            print("Cleaning game DB")
+            eveDB.drop("mapStargates")
+
+        if deferIndexes:
+            with timed("indexes"):
+                eveDB.create(eveIndexes)
+
+    def updateDB(changes):
+        nonlocal bulk
+        print("Updating game DB ({} members changed)".format(len(changes)))
+        bulk = BulkInsert(eveDB, chunkSize)
+        setupDB()
+
+        if TYPE_IDS in changes:
+            with timed("invTypes"):
+                print("Populating invTypes")
+                eveDB.execute("DELETE FROM invTypes")
+                eveDB.insertmany("invTypes",
+                    ("typeID", "typeName", "description", "volume"),
+                    iterTypes()
+                )
+                report.addRows("invTypes", eveDB.cursor.rowcount)
+
+        directories = {regionDir(member) for member in changes} - {None}
+        if directories or INV_NAMES in changes:
+            reloadNames = invNames and INV_NAMES in changes
+            if reloadNames:
+                eveDB.execute("DELETE FROM invNames")
+            popNames(reloadNames)
+
+        with timed("mapDenormalize"):
+            for directory in sorted(directories):
+                regionID = regionIDs.pop(directory, None)
+                if regionID is not None:
+                    print("    Removing region {}".format(directory))
+                    eveDB.execute("""DELETE FROM mapStargates WHERE entranceID IN (
+                        SELECT itemID FROM mapDenormalize
+                        WHERE groupID = 10 AND regionID = ?)""", (regionID,))
+                    eveDB.execute(
+                        "DELETE FROM mapDenormalize WHERE regionID = ? OR itemID = ?",
+                        (regionID, regionID)
+                    )
+            popUniverse([regionFile for regionFile in _getFileList('/eve', 'region')
+                if regionDir(regionFile) in directories])
+            bulk.flush()
+            if INV_NAMES in changes:
+                # Items of the untouched regions may have been renamed
+                print("    Renaming items")
+                eveDB.executemany(
+                    "UPDATE mapDenormalize SET itemName = ? WHERE itemID = ? AND itemName IS NOT ?",
+                    ((itemName, itemID, itemName)
+                        for itemID, itemName in zip(names.ids, names.names))
+                )
 
-        eveDB.execute("VACUUM")
-        resourcesZip.close()
+        eveDB.execute("DELETE FROM metadata")
+        popMetadata()
 
+        with timed("mapJumps"):
+            eveDB.execute("DELETE FROM mapJumps")
+            popMapJumps()
+
+        with timed("hierarchy"):
+            popHierarchy()
+
+        with timed("spatialIndex"):
+            popSpatialIndex()
+
+        with timed("searchIndex"):
+            popSearchIndex()
+
+        eveDB.commit()
+
+    if profile not in BUILD_PROFILES:
+        raise ValueError("Unknown build profile {}".format(profile))
+    if profiler is not None and profiler not in PROFILERS:
+        raise ValueError("Unknown profiler {}".format(profiler))
+    deferIndexes = profile != "default"
+    eveIndexes = _buildIndexes(compact)
+
+    with timed("resources"):
+        resourcesReady = getResourcesFile()
+    if resourcesReady and not upToDate:
+        with profiled(profiler, report, gameDB):
+            changes = None
+            if incremental and os.path.isfile(gameDB):
+                changes = diffResources()
+            if changes is None:
+                buildDB()
+            else:
+                try:
+                    updateDB(changes)
+                except BaseException:
+                    # The DB may be half updated, rebuild it from scratch next time
+                    eveDB.close()
+                    os.remove(gameDB)
+                    raise
+            if deferIndexes:
+                with timed("analyze"):
+                    eveDB.execute("ANALYZE")
+                    eveDB.commit()
+            with timed("vacuum"):
+                eveDB.execute("VACUUM")
+            if jumpMatrix:
+                with timed("jumpMatrix"):
+                    print("Computing jump matrix")
+                    from evedata.jumps import buildJumpMatrix
+                    print("    {} systems".format(buildJumpMatrix(eveDB, workers)))
+            if export:
+                with timed("export"):
+                    print("Exporting columns")
+                    from evedata.columnar import exportTables
+                    for table, info in exportTables(eveDB)["tables"].items():
+                        print("    {} : {} rows".format(table, info["rows"]))
+            if artifact:
+                with timed("artifact"):
+                    print("Compressing game DB")
+                    from evedata.artifact import buildArtifact
+                    manifest = buildArtifact(eveDB)
+                    for entry in (manifest, manifest.get("jumps")):
+                        if entry:
+                            print("    {} : {} -> {} bytes".format(entry["file"],
+                                entry["size"], entry["compressed_size"]))
+        resourcesZip.close()
+        peak = peakRSS()
+        if peak is not None:
+            print("Peak RSS : {:.1f} MB".format(peak))
+        print("Build done in {:.2f} s".format(sum(timings.values())))
+        report.save(reportPath(gameDB))
+    return timings
 
 if __name__ == '__main__':
     create_db()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from evedata import queries
+from service.queryDB import EveDB
+
+# evedata.queries functions available as coroutines
+QUERIES = (
+    "getMapIdFromName",
+    "getSystemIdFromName",
+    "getConstellationIdFromName",
+    "getMapNameFromId",
+    "getStationsFromSystemId",
+    "getStationsFromConstellationId",
+    "getStationsFromRegionId",
+    "getStationCount",
+    "getStationCounts",
+    "getRegionsAround",
+    "getConstellationsAround",
+    "getMapIdsFromNames",
+    "getSystemIdsFromNames",
+    "getConstellationIdsFromNames",
+    "getMapNamesFromIds",
+    "getStationsFromSystemIds",
+    "getSystemsWithinRadius",
+    "getClosestStations",
+    "findMapIdFromName",
+    "findTypeIdFromName",
+    "searchNames",
+    "fuzzySearchNames",
+)
+WORKERS = 4
+MAX_PENDING = 256
+
+
+def _freeze(value):
+    # Hashable form of the arguments of a call
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+class _Call():
+    '''A query running in the executor and the coroutines waiting for it'''
+
+    __slots__ = ("future", "waiters", "connection", "lock")
+
+    def __init__(self):
+        self.future = None
+        self.waiters = 0
+        self.connection = None
+        self.lock = threading.Lock()
+
+
+class AsyncQueries():
+    '''Run evedata.queries from asyncio without blocking the event loop
+
+    Args:
+        workers (int - optionnal): Threads running the queries, each one
+            with its own read-only EveDB connection
+        maxPending (int - optionnal): Queries running or queued at most,
+            the next calls wait for a slot
+
+    Notes:
+        EveDB is switched to read-only connections (see EveDB.setReadOnly).
+        Identical calls made while one is in flight share its result. A
+        query is cancelled, and interrupted if it already runs, once all
+        the coroutines waiting for it are cancelled. An instance serves one
+        event loop.
+    '''
+
+    __instance = None
+
+    @classmethod
+    def getInstance(cls):
+        if cls.__instance is None:
+            cls.__instance = AsyncQueries()
+        return cls.__instance
+
+    @classmethod
+    def reset(cls):
+        if cls.__instance is not None:
+            cls.__instance.close()
+        cls.__instance = None
+
+    def __init__(self, workers = WORKERS, maxPending = MAX_PENDING):
+        EveDB.setReadOnly()
+        self.executor = ThreadPoolExecutor(workers)
+        self.maxPending = maxPending
+        self.inFlight = {}
+        self._slots = None
+
+    async def call(self, function, *args, **kwargs):
+        '''Await function(*args, **kwargs) run by a worker thread
+
+        Args:
+            function (callable): A blocking function using EveDB
+        '''
+        try:
+            key = (function, _freeze(args), _freeze(kwargs))
+            hash(key)
+        except TypeError:
+            key = None
+        entry = self._inFlight(key)
+        if entry is None:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.maxPending)
+            await self._slots.acquire()
+            # The same call may have started while waiting for a slot
+            entry = self._inFlight(key)
+            if entry is None:
+                entry = self._start(key, function, args, kwargs)
+            else:
+                self._slots.release()
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.future)
+        finally:
+            entry.waiters -= 1
+            if not entry.waiters and not entry.future.done():
+                # Nobody waits for the result anymore, the next identical
+                # call starts a new query
+                if self.inFlight.get(key) is entry:
+                    del self.inFlight[key]
+                entry.future.cancel()
+                with entry.lock:
+                    if entry.connection is not None:
+                        entry.connection.interrupt()
+
+    def _inFlight(self, key):
+        # A cancelled or finished call is not shared anymore
+        entry = self.inFlight.get(key) if key is not None else None
+        if entry is None or entry.future.done():
+            return None
+        return entry
+
+    def _start(self, key, function, args, kwargs):
+        loop = asyncio.get_running_loop()
+        entry = _Call()
+        work = self.executor.submit(self._run, entry, function, args, kwargs)
+        # The slot is released once the worker thread is done with the query,
+        # not when its future is cancelled
+        work.add_done_callback(partial(self._release, loop))
+        entry.future = asyncio.wrap_future(work, loop=loop)
+        entry.future.add_done_callback(partial(self._done, key, entry))
+        if key is not None:
+            self.inFlight[key] = entry
+        return entry
+
+    def _run(self, entry, function, args, kwargs):
+        # In a worker thread
+        with entry.lock:
+            entry.connection = EveDB.getInstance().connection
+        try:
+            return function(*args, **kwargs)
+        finally:
+            with entry.lock:
+                entry.connection = None
+
+    def _release(self, loop, work):
+        # In the worker thread, or the event loop when cancelled before running
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            # The event loop is closed
+            pass
+
+    def _done(self, key, entry, future):
+        if self.inFlight.get(key) is entry:
+            del self.inFlight[key]
+        if not future.cancelled():
+            # Retrieved, the waiters may all be gone
+            future.exception()
+
+    async def select(self, table, columns = "*", where = None):
+        '''Await EveDB.selectall, see QueryDB.select'''
+        return await self.call(_selectall, table, columns, where)
+
+    def close(self):
+        '''Wait for the running queries and close the connections'''
+        self.executor.shutdown()
+        EveDB.closeReaders()
+
+
+def _selectall(table, columns, where):
+    return EveDB.getInstance().selectall(table, columns, where)
+
+def _method(name):
+    function = getattr(queries, name)
+
+    async def method(self, *args, **kwargs):
+        return await self.call(function, *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = "Await evedata.queries.{}".format(name)
+    return method
+
+def _shortcut(name):
+    async def shortcut(*args, **kwargs):
+        return await getattr(AsyncQueries.getInstance(), name)(*args, **kwargs)
+
+    shortcut.__name__ = name
+    shortcut.__doc__ = "Await evedata.queries.{} with the shared AsyncQueries".format(name)
+    return shortcut
+
+for _name in QUERIES:
+    setattr(AsyncQueries, _name, _method(_name))
+    globals()[_name] = _shortcut(_name)
+
+async def select(table, columns = "*", where = None):
+    '''Await EveDB.selectall with the shared AsyncQueries'''
+    return await AsyncQueries.getInstance().select(table, columns, where)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import argparse
+import hashlib
+import json
+import lzma
+import os
+import sqlite3
+
+from config import getGameDB
+from evedata.download import fileDigests
+
+CHUNK = 1024 * 1024
+# xz preset of the artifact, higher presets are slower without being smaller
+# on the game DB
+PRESET = 6
+ARTIFACT_FORMAT = "xz"
+
+
+class ArtifactError(Exception):
+    '''A decompressed file does not match the manifest of the artifact'''
+
+
+def artifactPaths(gameDB = None):
+    '''Return the paths of the compressed DB and of its manifest'''
+    path = (gameDB or getGameDB()) + "." + ARTIFACT_FORMAT
+    return path, path + ".json"
+
+def _distributionCopy(eveDB, path):
+    # Copy of the game DB without the state of the incremental builds
+    from evedata import MEMBER_FIELD, REGION_FIELD
+
+    if os.path.isfile(path):
+        os.remove(path)
+    copy = sqlite3.connect(path)
+    try:
+        eveDB.connection.backup(copy)
+        copy.execute("DROP TABLE IF EXISTS mapStargates")
+        copy.execute("""DELETE FROM metadata WHERE field_name == 'schema_hash'
+            OR substr(field_name, 1, ?) == ? OR substr(field_name, 1, ?) == ?""",
+            (len(MEMBER_FIELD), MEMBER_FIELD, len(REGION_FIELD), REGION_FIELD))
+        copy.commit()
+        copy.execute("VACUUM")
+    finally:
+        copy.close()
+
+def _compress(source, path):
+    # xz stream of a file, return the sizes and sha256 of both
+    digest = hashlib.sha256()
+    compressedDigest = hashlib.sha256()
+    compressor = lzma.LZMACompressor(preset=PRESET)
+    size = 0
+    compressedSize = 0
+    with open(source, "rb") as sourceFile, open(path + ".tmp", "wb") as artifactFile:
+        for chunk in iter(lambda: sourceFile.read(CHUNK), b""):
+            size += len(chunk)
+            digest.update(chunk)
+            data = compressor.compress(chunk)
+            compressedSize += len(data)
+            compressedDigest.update(data)
+            artifactFile.write(data)
+        data = compressor.flush()
+        compressedSize += len(data)
+        compressedDigest.update(data)
+        artifactFile.write(data)
+    os.replace(path + ".tmp", path)
+    return {
+        "file": os.path.basename(path),
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "compressed_size": compressedSize,
+        "compressed_sha256": compressedDigest.hexdigest(),
+    }
+
+def _decompress(path, target, entry):
+    # Stream an xz file to target + ".tmp", checked against its entry
+    digest = hashlib.sha256()
+    compressedDigest = hashlib.sha256()
+    decompressor = lzma.LZMADecompressor()
+    size = 0
+    with open(path, "rb") as artifactFile, open(target + ".tmp", "wb") as targetFile:
+        for chunk in iter(lambda: artifactFile.read(CHUNK), b""):
+            compressedDigest.update(chunk)
+            data = decompressor.decompress(chunk)
+            size += len(data)
+            digest.update(data)
+            targetFile.write(data)
+    if not decompressor.eof:
+        raise ArtifactError("{} is truncated".format(path))
+    if compressedDigest.hexdigest() != entry["compressed_sha256"]:
+        raise ArtifactError("sha256 of {} does not match its manifest".format(path))
+    if size != entry["size"] or digest.hexdigest() != entry["sha256"]:
+        raise ArtifactError("Decompressed {} does not match its manifest".format(path))
+
+def _matches(path, entry):
+    return (os.path.isfile(path) and os.path.getsize(path) == entry["size"]
+        and fileDigests(path)[0] == entry["sha256"])
+
+def buildArtifact(eveDB = None, gameDB = None):
+    '''Compress the game DB with xz next to it, and its jump matrix
+
+    The artifact is made from a copy of the game DB without mapStargates
+    and the metadata of the incremental builds. The jump matrix (see
+    evedata.jumps), when built, is compressed in its own file and its
+    manifest is kept in the one of the artifact.
+
+    Args:
+        eveDB (QueryDB - optionnal): The game DB, EveDB by default, the
+            dump_time of the manifest is read from it
+        gameDB (str - optionnal): Path of the game DB
+
+    Returns:
+        dict: The manifest, saved next to the artifact: size and sha256 of
+        the distributed DB and of the artifact, dump_time of the DB, the
+        same for the jump matrix under "jumps"
+    '''
+    from evedata.jumps import matrixPaths
+
+    if eveDB is None:
+        from service.queryDB import EveDB
+        eveDB = EveDB.getInstance()
+    gameDB = gameDB or getGameDB()
+    path, manifestPath = artifactPaths(gameDB)
+    copyPath = gameDB + ".dist"
+    _distributionCopy(eveDB, copyPath)
+    try:
+        manifest = _compress(copyPath, path)
+    finally:
+        os.remove(copyPath)
+    manifest["format"] = ARTIFACT_FORMAT
+    manifest["dump_time"] = eveDB.dumpTime()
+    matrixPath, matrixManifestPath = matrixPaths(gameDB)
+    if os.path.isfile(matrixPath) and os.path.isfile(matrixManifestPath):
+        manifest["jumps"] = _compress(matrixPath, matrixPath + "." + ARTIFACT_FORMAT)
+        with open(matrixManifestPath) as matrixManifestFile:
+            manifest["jumps"]["manifest"] = json.load(matrixManifestFile)
+    with open(manifestPath + ".tmp", "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=4, sort_keys=True)
+    os.replace(manifestPath + ".tmp", manifestPath)
+    return manifest
+
+def installArtifact(path, gameDB = None, manifestPath = None):
+    '''Decompress an artifact to the game DB, streaming
+
+    The jump matrix of the artifact, if any, is installed next to the game
+    DB with its manifest.
+
+    Args:
+        path (str): The compressed DB
+        gameDB (str - optionnal): Where the DB is written
+        manifestPath (str - optionnal): Its manifest, path + ".json" by
+            default
+
+    Returns:
+        bool: False when the game DB and its jump matrix already match the
+        manifest
+
+    Raises:
+        ArtifactError: The artifact or the decompressed files do not match
+            the manifest, the game DB is left untouched
+    '''
+    from evedata.jumps import matrixPaths
+
+    gameDB = gameDB or getGameDB()
+    with open(manifestPath or path + ".json") as manifestFile:
+        manifest = json.load(manifestFile)
+    files = [(path, gameDB, manifest)]
+    matrixManifest = None
+    if "jumps" in manifest:
+        matrixPath, matrixManifestPath = matrixPaths(gameDB)
+        files.append((os.path.join(os.path.dirname(path), manifest["jumps"]["file"]),
+            matrixPath, manifest["jumps"]))
+        matrixManifest = manifest["jumps"]["manifest"]
+        try:
+            with open(matrixManifestPath) as matrixManifestFile:
+                if json.load(matrixManifestFile) == matrixManifest:
+                    matrixManifest = None
+        except (OSError, ValueError):
+            pass
+    files = [(source, target, entry) for source, target, entry in files
+        if not _matches(target, entry)]
+    if not files and matrixManifest is None:
+        return False
+    try:
+        for source, target, entry in files:
+            _decompress(source, target, entry)
+    except BaseException:
+        for source, target, entry in files:
+            if os.path.isfile(target + ".tmp"):
+                os.remove(target + ".tmp")
+        raise
+    for source, target, entry in files:
+        os.replace(target + ".tmp", target)
+    if matrixManifest is not None:
+        with open(matrixManifestPath + ".tmp", "w") as matrixManifestFile:
+            json.dump(matrixManifest, matrixManifestFile)
+        os.replace(matrixManifestPath + ".tmp", matrixManifestPath)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Install a compressed game DB")
+    parser.add_argument("artifact", help="the eve.db.xz file")
+    parser.add_argument("db", help="where eve.db is written")
+    args = parser.parse_args()
+    if installArtifact(args.artifact, args.db):
+        print("{} installed".format(args.db))
+    else:
+        print("{} already up to date".format(args.db))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from service.queryDB import EveDB
+
+MAP_COLUMNS = ("itemID", "groupID", "solarSystemID", "constellationID",
+    "regionID", "itemName")
+TYPE_COLUMNS = ("typeID", "typeName", "volume")
+
+
+class MapItem():
+    '''A row of mapDenormalize'''
+
+    __slots__ = MAP_COLUMNS
+
+    def __init__(self, row):
+        for column, value in zip(MAP_COLUMNS, row):
+            setattr(self, column, value)
+        if self.itemName is not None:
+            self.itemName = sys.intern(self.itemName)
+
+
+class TypeItem():
+    '''A row of invTypes (without description)'''
+
+    __slots__ = TYPE_COLUMNS
+
+    def __init__(self, row):
+        self.typeID, self.typeName, self.volume = row
+        self.typeName = sys.intern(self.typeName)
+
+
+class StaticCache():
+    '''In memory copy of the static map and type data
+
+    Args:
+        maxSize (int - optionnal): Keep at most maxSize items per lookup
+            (LRU, filled on demand), everything is preloaded otherwise
+        checkInterval (float - optionnal): Seconds between two checks of
+            metadata.dump_time, the cache is emptied when it changes
+
+    Notes:
+        Unknown keys raise KeyError. hits/misses count the lookups served
+        from memory and the others.
+    '''
+
+    __instance = None
+
+    @classmethod
+    def getInstance(cls):
+        if cls.__instance is None:
+            cls.__instance = StaticCache()
+        return cls.__instance
+
+    @classmethod
+    def configure(cls, maxSize = None, checkInterval = 60.0):
+        '''Replace the shared instance, see StaticCache'''
+        cls.__instance = StaticCache(maxSize, checkInterval)
+        return cls.__instance
+
+    @classmethod
+    def reset(cls):
+        cls.__instance = None
+
+    def __init__(self, maxSize = None, checkInterval = 60.0):
+        self.maxSize = maxSize
+        self.checkInterval = checkInterval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        self.dumpTime = EveDB.getInstance().dumpTime()
+        self._checked = time.monotonic()
+        if self.maxSize:
+            self._items = OrderedDict()
+            self._names = OrderedDict()
+            self._types = OrderedDict()
+            return
+        eveDB = EveDB.getInstance()
+        self._items = {}
+        self._names = {}
+        for row in eveDB.selectall("mapDenormalize", MAP_COLUMNS):
+            item = MapItem(row)
+            self._items[item.itemID] = item
+            if item.itemName is not None:
+                self._names.setdefault(item.itemName, item)
+        self._types = {}
+        for row in eveDB.selectall("invTypes", TYPE_COLUMNS):
+            self._types[row[0]] = TypeItem(row)
+
+    def _check(self):
+        now = time.monotonic()
+        if now - self._checked > self.checkInterval:
+            self._checked = now
+            if EveDB.getInstance().dumpTime() != self.dumpTime:
+                self._load()
+
+    def _get(self, attribute, key, table, column, columns, itemClass):
+        # The dicts are looked up after _check() as _load() replaces them
+        self._check()
+        if not self.maxSize:
+            item = getattr(self, attribute).get(key)
+            if item is None:
+                self.misses += 1
+                raise KeyError(key)
+            self.hits += 1
+            return item
+        with self._lock:
+            cache = getattr(self, attribute)
+            item = cache.get(key)
+            if item is not None:
+                cache.move_to_end(key)
+                self.hits += 1
+                return item
+            self.misses += 1
+        row = EveDB.getInstance().selectone(table, columns, {column: key})
+        if row is None:
+            raise KeyError(key)
+        item = itemClass(row)
+        with self._lock:
+            cache = getattr(self, attribute)
+            cache[key] = item
+            if len(cache) > self.maxSize:
+                cache.popitem(last=False)
+        return item
+
+    def mapItem(self, itemID):
+        '''Return the MapItem of an itemID'''
+        return self._get("_items", itemID, "mapDenormalize", "itemID",
+            MAP_COLUMNS, MapItem)
+
+    def mapItemFromName(self, itemName):
+        '''Return the MapItem of an itemName'''
+        return self._get("_names", itemName, "mapDenormalize", "itemName",
+            MAP_COLUMNS, MapItem)
+
+    def typeItem(self, typeID):
+        '''Return the TypeItem of a typeID'''
+        return self._get("_types", typeID, "invTypes", "typeID",
+            TYPE_COLUMNS, TypeItem)
+
+    def getMapIdFromName(self, itemName, whichID = "itemID"):
+        return getattr(self.mapItemFromName(itemName), whichID)
+
+    def getSystemIdFromName(self, itemName):
+        return self.mapItemFromName(itemName).solarSystemID
+
+    def getConstellationIdFromName(self, itemName):
+        return self.mapItemFromName(itemName).constellationID
+
+    def getMapNameFromId(self, itemID):
+        return self.mapItem(itemID).itemName
+
+    def getTypeName(self, typeID):
+        return self.typeItem(typeID).typeName
+
+    def stats(self):
+        '''Return the counters of the cache'''
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._items),
+            "names": len(self._names),
+            "types": len(self._types),
+            "maxSize": self.maxSize,
+            "dumpTime": self.dumpTime,
+        }
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import json
+import math
+import os
+import shutil
+import sys
+from array import array
+
+from config import getGameDB
+from evedata.npyio import NpyMap, writeNpy
+from service.queryDB import EveDB
+
+# Tables exported by exportTables
+EXPORT_TABLES = ("invTypes", "mapDenormalize", "mapJumps")
+MANIFEST = "manifest.json"
+
+# Array typecode and NumPy type of the numeric columns, by SQLite affinity
+_ENDIAN = "<" if sys.byteorder == "little" else ">"
+NUMERIC_TYPES = {
+    "int64": ("q", _ENDIAN + "i8", 0),
+    "float64": ("d", _ENDIAN + "f8", math.nan),
+}
+
+
+def exportPath(gameDB = None):
+    '''Return the directory of the columns exported next to the game DB'''
+    return os.path.splitext(gameDB or getGameDB())[0] + ".columns"
+
+def _columnType(declared):
+    # SQLite affinity rules, TEXT for anything else
+    declared = declared.upper()
+    if "INT" in declared:
+        return "int64"
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return "float64"
+    return "string"
+
+def _exportTable(eveDB, table, path):
+    # Write each column of a table in its own .npy file(s)
+    info = eveDB.execute('PRAGMA table_info("{}")'.format(table)).fetchall()
+    columns = [(row[1], _columnType(row[2])) for row in info]
+    # Rows sorted by primary key
+    keys = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+    values = []
+    for name, kind in columns:
+        if kind == "string":
+            values.append((array("q", [0]), bytearray(), bytearray()))
+        else:
+            values.append((array(NUMERIC_TYPES[kind][0]), None, bytearray()))
+    rows = 0
+    query = 'SELECT {} FROM "{}"'.format(
+        ", ".join('"{}"'.format(name) for name, _ in columns), table)
+    if keys:
+        query += " ORDER BY {}".format(", ".join('"{}"'.format(key) for key in keys))
+    for row in eveDB.execute(query):
+        rows += 1
+        for value, (name, kind), (items, data, nulls) in zip(row, columns, values):
+            nulls.append(value is None)
+            if kind == "string":
+                if value is not None:
+                    data.extend(str(value).encode("utf-8"))
+                items.append(len(data))
+            else:
+                items.append(NUMERIC_TYPES[kind][2] if value is None else value)
+    manifest = {}
+    for (name, kind), (items, data, nulls) in zip(columns, values):
+        base = os.path.join(path, "{}.{}".format(table, name))
+        if kind == "string":
+            writeNpy(base + ".npy", "|u1", (len(data),), (data,))
+            writeNpy(base + ".offsets.npy", _ENDIAN + "i8", (rows + 1,), (items,))
+        else:
+            writeNpy(base + ".npy", NUMERIC_TYPES[kind][1], (rows,), (items,))
+        hasNulls = any(nulls)
+        if hasNulls:
+            writeNpy(base + ".nulls.npy", "|u1", (rows,), (nulls,))
+        manifest[name] = {"type": kind, "nulls": hasNulls}
+    return {"rows": rows, "columns": manifest}
+
+def exportTables(eveDB = None, tables = EXPORT_TABLES, path = None):
+    '''Export tables of the game DB as memory mappable columns
+
+    Args:
+        eveDB (QueryDB - optionnal): The game DB, EveDB by default
+        tables (iterable - optionnal): The tables exported
+        path (str - optionnal): Directory of the export, see exportPath
+
+    Returns:
+        dict: The manifest of the export
+
+    Notes:
+        Each column is a .npy file named <table>.<column>.npy. Strings are
+        an UTF-8 blob indexed by <table>.<column>.offsets.npy (rows + 1
+        int64). Columns with NULLs have a <table>.<column>.nulls.npy uint8
+        mask, NULLs are stored as 0 or NaN. The manifest keeps the
+        dump_time of the game DB.
+    '''
+    eveDB = eveDB or EveDB.getInstance()
+    path = path or exportPath()
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    manifest = {
+        "dump_time": eveDB.dumpTime(),
+        "tables": {table: _exportTable(eveDB, table, path) for table in tables},
+    }
+    with open(os.path.join(path, MANIFEST), "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=1)
+    return manifest
+
+
+class StringColumn():
+    '''A string column mapped in memory, items are decoded on access
+
+    Args:
+        offsets (memoryview): rows + 1 int64 offsets in data
+        data (memoryview): The UTF-8 blob
+        nulls (memoryview - optionnal): The NULL mask
+    '''
+
+    def __init__(self, offsets, data, nulls = None):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class ColumnStore():
+    '''The columns exported by exportTables, memory mapped
+
+    Args:
+        path (str - optionnal): Directory of the export, see exportPath
+
+    Notes:
+        column() returns a memoryview cast to int64/float64 items or a
+        StringColumn, nulls() the NULL mask if any, without copying the
+        files. numpy() returns NumPy arrays when NumPy is installed.
+    '''
+
+    __instance = None
+
+    @classmethod
+    def getInstance(cls):
+        if cls.__instance is None:
+            cls.__instance = ColumnStore()
+        return cls.__instance
+
+    @classmethod
+    def reset(cls):
+        if cls.__instance is not None:
+            cls.__instance.close()
+        cls.__instance = None
+
+    def __init__(self, path = None):
+        self.path = path or exportPath()
+        with open(os.path.join(self.path, MANIFEST)) as manifestFile:
+            manifest = json.load(manifestFile)
+        self.dumpTime = manifest["dump_time"]
+        self.tables = manifest["tables"]
+        self.maps = {}
+
+    def isStale(self, eveDB = None):
+        '''Check if the game DB was built from another SDE than the export'''
+        return (eveDB or EveDB.getInstance()).dumpTime() != self.dumpTime
+
+    def _map(self, fileName):
+        if fileName not in self.maps:
+            self.maps[fileName] = NpyMap(os.path.join(self.path, fileName))
+        return self.maps[fileName]
+
+    def _typeOf(self, table, column):
+        try:
+            return self.tables[table]["columns"][column]
+        except KeyError:
+            raise KeyError("{}.{}".format(table, column)) from None
+
+    def rows(self, table):
+        return self.tables[table]["rows"]
+
+    def columns(self, table):
+        return list(self.tables[table]["columns"])
+
+    def nulls(self, table, column):
+        '''Return the NULL mask of a column, None without NULLs'''
+        if not self._typeOf(table, column)["nulls"]:
+            return None
+        return self._map("{}.{}.nulls.npy".format(table, column)).data
+
+    def column(self, table, column):
+        '''Return the items of a column'''
+        kind = self._typeOf(table, column)["type"]
+        base = "{}.{}".format(table, column)
+        if kind == "string":
+            return StringColumn(
+                self._map(base + ".offsets.npy").data.cast("q"),
+                self._map(base + ".npy").data,
+                self.nulls(table, column))
+        return self._map(base + ".npy").data.cast(NUMERIC_TYPES[kind][0])
+
+    def numpy(self, table):
+        '''Return {column: numpy array} of a table, strings are decoded
+
+        Raises:
+            ImportError: NumPy is not installed
+        '''
+        import numpy
+
+        arrays = {}
+        for column, info in self.tables[table]["columns"].items():
+            base = os.path.join(self.path, "{}.{}".format(table, column))
+            if info["type"] == "string":
+                arrays[column] = numpy.array(list(self.column(table, column)),
+                    dtype=object)
+            else:
+                arrays[column] = numpy.load(base + ".npy", mmap_mode="r")
+        return arrays
+
+    def close(self):
+        for npyMap in self.maps.values():
+            npyMap.close()
+        self.maps = {}
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import hashlib
+import json
+import os
+import re
+
+import requests
+from dateutil.parser import parse
+
+DOWNLOAD_CHUNK = 1024 * 1024
+# A S3 ETag is the MD5 of the object unless it was uploaded in parts
+MD5_ETAG = re.compile(r'^"?([0-9a-fA-F]{32})"?$')
+
+
+class DownloadError(Exception):
+    '''The downloaded file does not match what the server announced'''
+
+
+def _readJson(path):
+    try:
+        with open(path) as jsonFile:
+            return json.load(jsonFile)
+    except (OSError, ValueError):
+        return None
+
+def _writeJson(path, data):
+    with open(path + ".tmp", "w") as jsonFile:
+        json.dump(data, jsonFile, indent=4, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def fileDigests(path):
+    '''Return the sha256 and md5 hex digests of a file, read by chunks'''
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(path, "rb") as cachedFile:
+        for chunk in iter(lambda: cachedFile.read(DOWNLOAD_CHUNK), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+def _validators(headers):
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+    }
+
+
+class ResourcesCache():
+    '''A local copy of a remote file with the headers it was fetched with
+
+    Args:
+        url (str): The URL of the file
+        path (str): Where the file is stored, "<path>.json" keeps the cached
+            headers and checksum, "<path>.part" an interrupted download
+
+    Notes:
+        fetch() only downloads the file when the server reports a change
+        (ETag / Last-Modified conditional GET) and resumes an interrupted
+        download with a Range request.
+    '''
+
+    def __init__(self, url, path):
+        self.url = url
+        self.path = path
+        self.metaPath = path + ".json"
+        self.partPath = path + ".part"
+        self.partMetaPath = path + ".part.json"
+        self.meta = _readJson(self.metaPath)
+        if self.meta and (self.meta.get("url") != url
+                or not os.path.isfile(path)
+                or os.path.getsize(path) != self.meta.get("size")):
+            self.meta = None
+
+    @property
+    def sdeVersion(self):
+        '''The Last-Modified header of the cached file as a timestamp'''
+        if not self.meta or not self.meta.get("last_modified"):
+            return None
+        return int(parse(self.meta["last_modified"]).timestamp())
+
+    def verify(self):
+        '''Check the cached file against its recorded checksum'''
+        return bool(self.meta) and fileDigests(self.path)[0] == self.meta["sha256"]
+
+    def clear(self):
+        for path in (self.path, self.metaPath, self.partPath, self.partMetaPath):
+            if os.path.isfile(path):
+                os.remove(path)
+        self.meta = None
+
+    def fetch(self, timeout = 60):
+        '''Bring the cached file up to date
+
+        Args:
+            timeout (int - optionnal): Socket timeout in seconds
+
+        Returns:
+            bool: True when a new file was downloaded, False when the cached
+                one is still current
+
+        Raises:
+            requests.RequestException: The download failed
+            DownloadError: The checksum of the download is wrong
+        '''
+        # Sizes and checksums are those of the raw file
+        headers = {"Accept-Encoding": "identity"}
+        offset = 0
+        partMeta = _readJson(self.partMetaPath)
+        if partMeta and partMeta.get("url") == self.url and os.path.isfile(self.partPath):
+            offset = os.path.getsize(self.partPath)
+            headers["Range"] = "bytes={}-".format(offset)
+            # The server answers with the whole file if it changed meanwhile
+            headers["If-Range"] = partMeta.get("etag") or partMeta.get("last_modified")
+        elif self.meta:
+            if self.meta.get("etag"):
+                headers["If-None-Match"] = self.meta["etag"]
+            if self.meta.get("last_modified"):
+                headers["If-Modified-Since"] = self.meta["last_modified"]
+
+        with requests.get(self.url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 304:
+                if self.verify():
+                    return False
+                print("Cached {} is corrupted, downloading it again".format(self.path))
+                self.clear()
+                return self.fetch(timeout)
+            if response.status_code == 416:
+                # The partial file is not a prefix of the remote one
+                os.remove(self.partPath)
+                os.remove(self.partMetaPath)
+                return self.fetch(timeout)
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                print("Resuming download at byte {}".format(offset))
+                mode = "ab"
+                validators = partMeta
+                size = int(response.headers["Content-Range"].rsplit("/", 1)[1])
+            else:
+                mode = "wb"
+                validators = _validators(response.headers)
+                size = response.headers.get("Content-Length")
+                size = int(size) if size is not None else None
+                _writeJson(self.partMetaPath, dict(validators, url=self.url))
+            with open(self.partPath, mode) as partFile:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                    partFile.write(chunk)
+
+        if size is not None and os.path.getsize(self.partPath) != size:
+            raise DownloadError("{} is {} bytes long instead of {}".format(
+                self.url, os.path.getsize(self.partPath), size))
+        sha256, md5 = fileDigests(self.partPath)
+        etag = MD5_ETAG.match(validators.get("etag") or "")
+        if etag and etag.group(1).lower() != md5:
+            os.remove(self.partPath)
+            os.remove(self.partMetaPath)
+            raise DownloadError("MD5 of {} does not match its ETag".format(self.url))
+
+        os.replace(self.partPath, self.path)
+        os.remove(self.partMetaPath)
+        self.meta = {
+            "url": self.url,
+            "etag": validators.get("etag"),
+            "last_modified": validators.get("last_modified"),
+            "size": os.path.getsize(self.path),
+            "sha256": sha256,
+        }
+        _writeJson(self.metaPath, self.meta)
+        if self.sdeVersion:
+            os.utime(self.path, (self.sdeVersion, self.sdeVersion))
+        return True
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import heapq
+from array import array
+
+from service.queryDB import EveDB
+
+# Lowest security status displayed as high security (0.5 once rounded)
+HIGHSEC = 0.45
+# Cost of a jump into a system avoided by a secure/insecure route
+AVOID_PENALTY = 50.0
+ROUTE_PREFERENCES = ("shortest", "secure", "insecure")
+
+
+def bfs(offsets, targets, source, maxJumps = None, target = None):
+    '''Breadth first search over a CSR adjacency
+
+    Args:
+        offsets (array): targets[offsets[i]:offsets[i + 1]] are the
+            neighbours of the system index i
+        targets (array): System indexes
+        source (int): Index of the starting system
+        maxJumps (int - optionnal): Do not go further
+        target (int - optionnal): Stop once this index is reached
+
+    Returns:
+        (list, list): Number of jumps from source (-1 if not reached) and
+            predecessor of each system index (-1 for none)
+    '''
+    count = len(offsets) - 1
+    jumps = [-1] * count
+    previous = [-1] * count
+    jumps[source] = 0
+    frontier = [source]
+    depth = 0
+    while frontier and (maxJumps is None or depth < maxJumps):
+        depth += 1
+        nextFrontier = []
+        for index in frontier:
+            for neighbour in targets[offsets[index]:offsets[index + 1]]:
+                if jumps[neighbour] < 0:
+                    jumps[neighbour] = depth
+                    previous[neighbour] = index
+                    nextFrontier.append(neighbour)
+        if target is not None and jumps[target] >= 0:
+            break
+        frontier = nextFrontier
+    return jumps, previous
+
+
+class UniverseGraph():
+    '''The stargate network of the game DB loaded in memory
+
+    Args:
+        eveDB (QueryDB - optionnal): The DB to load, EveDB by default
+
+    Notes:
+        Solar systems are numbered by increasing solarSystemID, their
+        adjacency is stored in CSR form: the neighbours of the system index
+        i are targets[offsets[i]:offsets[i + 1]].
+    '''
+
+    __instance = None
+
+    @classmethod
+    def getInstance(cls):
+        if cls.__instance is None:
+            cls.__instance = UniverseGraph()
+        return cls.__instance
+
+    @classmethod
+    def reset(cls):
+        cls.__instance = None
+
+    def __init__(self, eveDB = None):
+        eveDB = eveDB or EveDB.getInstance()
+        systems = sorted(tuple(row) for row in eveDB.selectall("mapDenormalize",
+            ("itemID", "constellationID", "regionID", "security"),
+            {"groupID": 5}
+        ))
+        self.systemIDs = array("q", [row[0] for row in systems])
+        self.constellationIDs = array("q", [row[1] for row in systems])
+        self.regionIDs = array("q", [row[2] for row in systems])
+        # Security is unknown in DB built before it was stored for systems
+        self.security = array("d", [row[3] or 0.0 for row in systems])
+        self.indexes = {systemID: index for index, systemID in enumerate(self.systemIDs)}
+
+        neighbours = [[] for _ in systems]
+        for fromID, toID in eveDB.selectall("mapJumps",
+                ("fromSolarSystemID", "toSolarSystemID")):
+            if fromID in self.indexes and toID in self.indexes:
+                neighbours[self.indexes[fromID]].append(self.indexes[toID])
+        self.offsets = array("l", [0])
+        self.targets = array("l")
+        for targets in neighbours:
+            self.targets.extend(sorted(set(targets)))
+            self.offsets.append(len(self.targets))
+        self._regionNeighbours = None
+        self._constellationNeighbours = None
+
+    def __len__(self):
+        return len(self.systemIDs)
+
+    def index(self, systemID):
+        '''Return the index of a solar system, KeyError if unknown'''
+        return self.indexes[systemID]
+
+    def neighbours(self, systemID):
+        '''Return the solar systems one jump away'''
+        index = self.indexes[systemID]
+        return [self.systemIDs[x]
+            for x in self.targets[self.offsets[index]:self.offsets[index + 1]]]
+
+    def jumps(self, fromID, toID):
+        '''Return the number of jumps between two systems, None if unreachable'''
+        target = self.indexes[toID]
+        jumps, _ = bfs(self.offsets, self.targets, self.indexes[fromID],
+            target=target)
+        return jumps[target] if jumps[target] >= 0 else None
+
+    def within(self, systemID, maxJumps):
+        '''Return {solarSystemID: jumps} of the systems up to maxJumps away'''
+        jumps, _ = bfs(self.offsets, self.targets, self.indexes[systemID],
+            maxJumps=maxJumps)
+        return {self.systemIDs[index]: count
+            for index, count in enumerate(jumps) if count >= 0}
+
+    def route(self, fromID, toID, preference = "shortest", penalty = AVOID_PENALTY):
+        '''Return the systems of a route, both ends included
+
+        Args:
+            fromID (int): solarSystemID of departure
+            toID (int): solarSystemID of destination
+            preference (str - optionnal): "shortest", "secure" to avoid
+                low/null security systems or "insecure" to avoid high
+                security ones, as the autopilot of the game
+            penalty (float - optionnal): Cost of a jump into an avoided system
+
+        Returns:
+            list: solarSystemIDs, None if the destination is unreachable
+        '''
+        if preference not in ROUTE_PREFERENCES:
+            raise ValueError("Unknown route preference {}".format(preference))
+        source = self.indexes[fromID]
+        target = self.indexes[toID]
+        if preference == "shortest":
+            jumps, previous = bfs(self.offsets, self.targets, source, target=target)
+            if jumps[target] < 0:
+                return None
+        else:
+            secure = preference == "secure"
+            costs = [1.0 if (security >= HIGHSEC) == secure else penalty
+                for security in self.security]
+            previous = self._dijkstra(source, target, costs)
+            if previous is None:
+                return None
+        route = [target]
+        while route[-1] != source:
+            route.append(previous[route[-1]])
+        return [self.systemIDs[index] for index in reversed(route)]
+
+    def _dijkstra(self, source, target, costs):
+        offsets = self.offsets
+        targets = self.targets
+        distances = [float("inf")] * len(self.systemIDs)
+        previous = [-1] * len(self.systemIDs)
+        distances[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            distance, index = heapq.heappop(heap)
+            if index == target:
+                return previous
+            if distance > distances[index]:
+                continue
+            for neighbour in targets[offsets[index]:offsets[index + 1]]:
+                candidate = distance + costs[neighbour]
+                if candidate < distances[neighbour]:
+                    distances[neighbour] = candidate
+                    previous[neighbour] = index
+                    heapq.heappush(heap, (candidate, neighbour))
+        return None
+
+    def _adjacency(self, groups):
+        adjacency = {}
+        for index, group in enumerate(groups):
+            adjacency.setdefault(group, set())
+            for neighbour in self.targets[self.offsets[index]:self.offsets[index + 1]]:
+                if groups[neighbour] != group:
+                    adjacency[group].add(groups[neighbour])
+        return adjacency
+
+    def regionNeighbours(self, regionID):
+        '''Return the regions linked to a region by a stargate'''
+        if self._regionNeighbours is None:
+            self._regionNeighbours = self._adjacency(self.regionIDs)
+        return sorted(self._regionNeighbours.get(regionID, ()))
+
+    def constellationNeighbours(self, constellationID):
+        '''Return the constellations linked to a constellation by a stargate'''
+        if self._constellationNeighbours is None:
+            self._constellationNeighbours = self._adjacency(self.constellationIDs)
+        return sorted(self._constellationNeighbours.get(constellationID, ()))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import json
+import os
+from bisect import bisect_left
+
+from config import getGameDB
+from evedata.graph import UniverseGraph, bfs
+from evedata.npyio import NpyMap, writeNpy
+from service.queryDB import EveDB
+
+# Solar systems of known space, wormholes and abyssal systems come after
+KSPACE_END = 31000000
+UNREACHABLE = 255
+SOURCES_PER_TASK = 64
+
+# CSR adjacency of the worker processes, set by _initWorker
+_offsets = None
+_targets = None
+
+
+def matrixPaths(gameDB = None):
+    '''Return the paths of the jump matrix (.npy) and its manifest (.json)'''
+    base = os.path.splitext(gameDB or getGameDB())[0]
+    return base + ".jumps.npy", base + ".jumps.json"
+
+def _initWorker(offsets, targets):
+    global _offsets
+    global _targets
+    _offsets = offsets
+    _targets = targets
+
+def _matrixRows(task):
+    # Rows of the matrix for a range of source indexes
+    start, end, count = task
+    rows = bytearray()
+    for source in range(start, end):
+        jumps, _ = bfs(_offsets, _targets, source)
+        rows.extend(
+            jump if 0 <= jump < UNREACHABLE else UNREACHABLE
+            for jump in jumps[:count]
+        )
+    return bytes(rows)
+
+def buildJumpMatrix(eveDB = None, workers = None):
+    '''Compute the jumps between all pairs of known space solar systems
+
+    Args:
+        eveDB (QueryDB - optionnal): The game DB, EveDB by default
+        workers (int - optionnal): Number of processes running the BFS,
+            default to the CPU count
+
+    Notes:
+        The matrix is a uint8 .npy file (UNREACHABLE when there is no
+        route) next to the game DB, the manifest keeps the solarSystemID of
+        each row/column and the dump_time of the game DB.
+    '''
+    from multiprocessing import Pool
+
+    eveDB = eveDB or EveDB.getInstance()
+    workers = workers or os.cpu_count() or 1
+    graph = UniverseGraph(eveDB)
+    # Systems are sorted by ID so known space is a prefix of the graph
+    count = bisect_left(graph.systemIDs, KSPACE_END)
+    tasks = [(start, min(start + SOURCES_PER_TASK, count), count)
+        for start in range(0, count, SOURCES_PER_TASK)]
+    matrixPath, manifestPath = matrixPaths()
+    if workers == 1:
+        _initWorker(graph.offsets, graph.targets)
+        writeNpy(matrixPath, "|u1", (count, count), map(_matrixRows, tasks))
+    else:
+        with Pool(workers, _initWorker, (graph.offsets, graph.targets)) as pool:
+            writeNpy(matrixPath, "|u1", (count, count),
+                pool.imap(_matrixRows, tasks))
+    with open(manifestPath, "w") as manifestFile:
+        json.dump({
+            "dump_time": eveDB.dumpTime(),
+            "matrix": os.path.basename(matrixPath),
+            "systems": list(graph.systemIDs[:count]),
+        }, manifestFile)
+    return count
+
+
+class JumpMatrix():
+    '''The precomputed jumps between known space solar systems
+
+    Args:
+        gameDB (str - optionnal): Path of the game DB the matrix was built
+            next to
+
+    Notes:
+        The matrix is memory mapped, a lookup does not read anything else.
+    '''
+
+    __instance = None
+
+    @classmethod
+    def getInstance(cls):
+        if cls.__instance is None:
+            cls.__instance = JumpMatrix()
+        return cls.__instance
+
+    @classmethod
+    def reset(cls):
+        if cls.__instance is not None:
+            cls.__instance.close()
+        cls.__instance = None
+
+    def __init__(self, gameDB = None):
+        matrixPath, manifestPath = matrixPaths(gameDB)
+        with open(manifestPath) as manifestFile:
+            manifest = json.load(manifestFile)
+        self.dumpTime = manifest["dump_time"]
+        self.indexes = {systemID: index
+            for index, systemID in enumerate(manifest["systems"])}
+        self.matrix = NpyMap(matrixPath)
+        self.count = self.matrix.shape[0]
+
+    def isStale(self, eveDB = None):
+        '''Check if the game DB was built from another SDE than the matrix'''
+        return (eveDB or EveDB.getInstance()).dumpTime() != self.dumpTime
+
+    def jumps(self, fromID, toID):
+        '''Return the jumps between two solar systems, None if unreachable
+
+        Raises:
+            KeyError: A system is not in known space
+        '''
+        count = self.matrix.data[self.indexes[fromID] * self.count + self.indexes[toID]]
+        return None if count == UNREACHABLE else count
+
+    def close(self):
+        self.matrix.close()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import sys
+from array import array
+from bisect import bisect_left
+
+# itemID ranges (start, end excluded) of the items named in mapDenormalize
+MAP_ID_RANGES = (
+    (10000000, 13000000), # Regions
+    (20000000, 23000000), # Constellations
+    (30000000, 33000000), # Solar systems
+    (60000000, 64000000), # Stations
+)
+
+
+def isMapID(itemID):
+    '''Check if an itemID is a region, constellation, solar system or station'''
+    for start, end in MAP_ID_RANGES:
+        if start <= itemID < end:
+            return True
+    return False
+
+
+class NameIndex():
+    '''A compact itemID -> itemName lookup
+
+    Args:
+        names (iterable): An iterable of (itemID, itemName)
+        keep (callable - optionnal): Filter on the itemID, only the map
+            items are kept by default
+
+    Notes:
+        The itemIDs are stored sorted in an array and looked up by
+        bisection, names are interned.
+    '''
+
+    __slots__ = ("ids", "names")
+
+    def __init__(self, names, keep = isMapID):
+        pairs = sorted(
+            (itemID, sys.intern(itemName)) for itemID, itemName in names
+            if keep(itemID)
+        )
+        self.ids = array("q", [itemID for itemID, _ in pairs])
+        self.names = [itemName for _, itemName in pairs]
+
+    def _index(self, itemID):
+        index = bisect_left(self.ids, itemID)
+        if index < len(self.ids) and self.ids[index] == itemID:
+            return index
+        return None
+
+    def get(self, itemID, default = None):
+        index = self._index(itemID)
+        if index is None:
+            return default
+        return self.names[index]
+
+    def __getitem__(self, itemID):
+        index = self._index(itemID)
+        if index is None:
+            raise KeyError(itemID)
+        return self.names[index]
+
+    def __contains__(self, itemID):
+        return self._index(itemID) is not None
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import ast
+import mmap
+import os
+import struct
+
+# Version 1.0 of the NumPy format, readable with numpy.load(mmap_mode="r")
+MAGIC = b"\x93NUMPY\x01\x00"
+ALIGNMENT = 64
+
+
+def writeNpy(path, descr, shape, chunks):
+    '''Write an array in the .npy format without NumPy
+
+    Args:
+        path (str): Path of the file
+        descr (str): NumPy type of the items, i.e. "|u1", "<i8", "<f8"
+        shape (tuple): Shape of the array (C order)
+        chunks (iterable): The raw data as bytes-like chunks
+
+    Notes:
+        The file is written next to path then renamed.
+    '''
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(
+        descr, repr(tuple(shape)))
+    # Data must start on an aligned offset, header ends with a newline
+    padding = -(len(MAGIC) + 2 + len(header) + 1) % ALIGNMENT
+    header = (header + " " * padding + "\n").encode("latin1")
+    with open(path + ".tmp", "wb") as npyFile:
+        npyFile.write(MAGIC)
+        npyFile.write(struct.pack("<H", len(header)))
+        npyFile.write(header)
+        for chunk in chunks:
+            npyFile.write(chunk)
+    os.replace(path + ".tmp", path)
+
+
+class NpyMap():
+    '''A .npy file mapped in memory
+
+    Args:
+        path (str): Path of the file
+
+    Notes:
+        data is a memoryview of the array, without any copy. Use
+        data.cast() to get typed items.
+    '''
+
+    def __init__(self, path):
+        with open(path, "rb") as npyFile:
+            if npyFile.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a version 1.0 .npy file".format(path))
+            length, = struct.unpack("<H", npyFile.read(2))
+            header = ast.literal_eval(npyFile.read(length).decode("latin1"))
+            offset = len(MAGIC) + 2 + length
+            size = os.fstat(npyFile.fileno()).st_size
+            self.map = mmap.mmap(npyFile.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if header["fortran_order"]:
+            raise ValueError("{} is in Fortran order".format(path))
+        self.descr = header["descr"]
+        self.shape = header["shape"]
+        self.data = memoryview(self.map)[offset:] if self.map else memoryview(b"")
+
+    def close(self):
+        self.data.release()
+        if self.map:
+            self.map.close()
@@ -19,29 +19,53 @@
 # along with pytt.  If not, see <http://www.gnu.org/licenses/>.
 # ==============================================================================
 
+import sqlite3
+from math import sqrt
+
 from service.queryDB import EveDB
 
-eveDB = EveDB.getInstance()
+LIGHT_YEAR = 9460730472580800.0 # meters
+# Radius of the first search of getClosestStations and farthest one
+CLOSEST_FIRST_RADIUS = 5.0
+CLOSEST_MAX_RADIUS = 1000.0
+# Kinds of searchNames (stored as their index) and the number of trigram
+# matches reranked by fuzzySearchNames
+SEARCH_KINDS = ("region", "constellation", "system", "station", "type")
+FUZZY_CANDIDATES = 200
+
+
+class MissingKeysError(KeyError):
+    '''Keys of a batch lookup missing from the DB
+
+    Args:
+        missing (list): The missing keys, in input order
+    '''
+
+    def __init__(self, missing):
+        super().__init__(missing)
+        self.missing = missing
+
 
 def getMapIdFromName(itemName, whichID="itemID" ):
-    return eveDB.selectone(
+    return EveDB.getInstance().selectone(
             "mapDenormalize",
             where={"itemName": itemName}
             )[whichID]
 
-def getMapIdsFromSystemId(solarSystemID):
-    return eveDB.selectall(
-            "mapDenormalize",
-            ("itemId",),
-            {"solarSystemID": solarSystemID, "GroupID": 15}
+def getMapIdsFromLocationId(locationID):
+    '''Return the rows (itemId,) of the stations of a system,
+    constellation or region'''
+    return EveDB.getInstance().selectall(
+            "mapLocationStations",
+            ("stationID AS itemId",),
+            {"locationID": locationID}
             )
 
+def getMapIdsFromSystemId(solarSystemID):
+    return getMapIdsFromLocationId(solarSystemID)
+
 def getMapIdsFromConstellationId(constellationID):
-    return eveDB.selectall(
-            "mapDenormalize",
-            ("itemId",),
-            {"constellationID": constellationID, "GroupID": 15}
-            )
+    return getMapIdsFromLocationId(constellationID)
 
 def getSystemIdFromName(itemName):
     return getMapIdFromName(itemName, "solarSystemID")
@@ -55,16 +79,257 @@ def getStationsFromSystemId(solarSystemID):
 def getStationsFromConstellationId(constellationID):
     return [x[0] for x in getMapIdsFromConstellationId(constellationID)]
 
+def getStationsFromRegionId(regionID):
+    return [x[0] for x in getMapIdsFromLocationId(regionID)]
+
+def getStationCount(locationID):
+    '''Return the number of stations of a system, constellation or region,
+    None for an unknown location'''
+    row = EveDB.getInstance().selectone(
+            "mapLocationCounts",
+            ("stations",),
+            {"locationID": locationID}
+            )
+    return row[0] if row else None
+
+def getStationCounts(groupID):
+    '''Return {locationID: stations} of all the regions (3),
+    constellations (4) or systems (5)'''
+    return dict(EveDB.getInstance().execute(
+        "SELECT locationID, stations FROM mapLocationCounts WHERE groupID == ?",
+        (groupID,)).fetchall())
+
 def getRegionsAround(regionID):
-    regionsAround = eveDB.select(
-                        "^mapJumps",
+    regionsAround = EveDB.getInstance().select(
+                        "mapRegionJumps",
                         ("toRegionID",),
-                        {"fromRegionID": regionID, "!toRegionID": regionID}
+                        {"fromRegionID": regionID}
                     )
     return [x[0] for x in regionsAround]
 
+def getConstellationsAround(constellationID):
+    constellationsAround = EveDB.getInstance().select(
+                        "mapConstellationJumps",
+                        ("toConstellationID",),
+                        {"fromConstellationID": constellationID}
+                    )
+    return [x[0] for x in constellationsAround]
+
 def getMapNameFromId(itemID):
-    return eveDB.selectone(
+    return EveDB.getInstance().selectone(
             "mapDenormalize",
             where={"itemID": itemID}
-            )["itemName"]
\ No newline at end of file
+            )["itemName"]
+
+def _lookup(column, keys, columns, strict):
+    # Rows of mapDenormalize for each key, None for missing ones
+    keys = list(keys)
+    found = {}
+    for row in EveDB.getInstance().selectin("mapDenormalize",
+            (column,) + columns, column, keys):
+        found.setdefault(row[0], row)
+    if strict:
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            raise MissingKeysError(missing)
+    return [found.get(key) for key in keys]
+
+def getMapIdsFromNames(itemNames, whichID="itemID", strict=False):
+    '''Batch getMapIdFromName
+
+    Args:
+        itemNames (iterable): The names looked for
+        whichID (str - optionnal): The column returned
+        strict (bool - optionnal): Raise MissingKeysError if a name is not
+            found, None is returned for it otherwise
+
+    Returns:
+        list: The IDs in the order of itemNames
+    '''
+    rows = _lookup("itemName", itemNames, (whichID,), strict)
+    return [row[1] if row else None for row in rows]
+
+def getSystemIdsFromNames(itemNames, strict=False):
+    return getMapIdsFromNames(itemNames, "solarSystemID", strict)
+
+def getConstellationIdsFromNames(itemNames, strict=False):
+    return getMapIdsFromNames(itemNames, "constellationID", strict)
+
+def getMapNamesFromIds(itemIDs, strict=False):
+    '''Batch getMapNameFromId, see getMapIdsFromNames'''
+    rows = _lookup("itemID", itemIDs, ("itemName",), strict)
+    return [row[1] if row else None for row in rows]
+
+def getStationsFromSystemIds(solarSystemIDs):
+    '''Batch getStationsFromSystemId
+
+    Returns:
+        list: A list of stationIDs per solarSystemID, in input order
+    '''
+    solarSystemIDs = list(solarSystemIDs)
+    stations = {}
+    for stationID, solarSystemID in EveDB.getInstance().selectin("mapLocationStations",
+            ("stationID", "locationID"), "locationID", solarSystemIDs):
+        stations.setdefault(solarSystemID, []).append(stationID)
+    return [list(stations.get(solarSystemID, [])) for solarSystemID in solarSystemIDs]
+
+def _center(itemID):
+    row = EveDB.getInstance().selectone("mapDenormalize",
+        ("x", "y", "z"), {"itemID": itemID})
+    if row is None:
+        raise KeyError(itemID)
+    return tuple(row)
+
+def _boxQuery(columns, joins, center, radius):
+    # Items of the systems in the bounding box of a sphere, R*Tree backed
+    query = """SELECT {}, system.x, system.y, system.z
+        FROM mapSolarSystemsRTree AS box
+        JOIN mapDenormalize AS system ON system.itemID == box.solarSystemID
+        {}
+        WHERE box.maxX >= ? AND box.minX <= ?
+            AND box.maxY >= ? AND box.minY <= ?
+            AND box.maxZ >= ? AND box.minZ <= ?""".format(columns, joins)
+    bounds = []
+    for value in center:
+        bounds.extend((value - radius, value + radius))
+    for row in EveDB.getInstance().execute(query, bounds):
+        distance = sqrt(sum((a - b) ** 2 for a, b in zip(center, row[-3:])))
+        if distance <= radius:
+            yield tuple(row[:-3]) + (distance / LIGHT_YEAR,)
+
+def getSystemsWithinRadius(solarSystemID, lightYears):
+    '''Return [(solarSystemID, distance)] of the systems up to lightYears
+    away, sorted by distance in light years (the system itself included)'''
+    center = _center(solarSystemID)
+    return sorted(_boxQuery("system.itemID", "", center, lightYears * LIGHT_YEAR),
+        key=lambda row: (row[1], row[0]))
+
+def getClosestStations(solarSystemID, count = 1, maxLightYears = CLOSEST_MAX_RADIUS):
+    '''Return [(stationID, solarSystemID, distance)] of the count closest
+    stations (groupID 15), sorted by distance in light years
+
+    Notes:
+        Distances are between solar systems, the search radius is doubled
+        until enough stations are found.
+    '''
+    center = _center(solarSystemID)
+    radius = min(CLOSEST_FIRST_RADIUS, maxLightYears)
+    while True:
+        stations = sorted(_boxQuery("station.stationID, system.itemID",
+                "JOIN mapLocationStations AS station ON station.locationID == system.itemID",
+                center, radius * LIGHT_YEAR),
+            key=lambda row: (row[2], row[0]))
+        if len(stations) >= count or radius >= maxLightYears:
+            return stations[:count]
+        radius = min(radius * 2, maxLightYears)
+
+def findMapIdFromName(itemName, whichID="itemID"):
+    '''Case insensitive getMapIdFromName, None for an unknown name'''
+    row = EveDB.getInstance().execute(
+        """SELECT "{}" FROM mapDenormalize
+        WHERE itemName = ? COLLATE NOCASE LIMIT 1""".format(whichID),
+        (itemName,)).fetchone()
+    return row[0] if row else None
+
+def findTypeIdFromName(typeName):
+    '''Case insensitive typeID of a typeName, None for an unknown name'''
+    row = EveDB.getInstance().execute(
+        "SELECT typeID FROM invTypes WHERE typeName = ? COLLATE NOCASE LIMIT 1",
+        (typeName,)).fetchone()
+    return row[0] if row else None
+
+def _kindsFilter(kinds):
+    if kinds is None:
+        return "", []
+    kinds = list(kinds)
+    unknown = set(kinds) - set(SEARCH_KINDS)
+    if unknown:
+        raise ValueError("Unknown kinds {}".format(sorted(unknown)))
+    return ("AND names.kind IN ({})".format(", ".join("?" * len(kinds))),
+        [SEARCH_KINDS.index(kind) for kind in kinds])
+
+def _quote(text):
+    return '"{}"'.format(text.replace('"', '""'))
+
+def searchNames(text, kinds=None, limit=10):
+    '''Autocomplete text with the names of the map items and types
+
+    Args:
+        text (str): The beginning of the words of a name, case insensitive
+        kinds (iterable - optionnal): Restrict the search to some SEARCH_KINDS
+        limit (int - optionnal): Maximum number of results
+
+    Returns:
+        list: [(name, kind, itemID)], exact matches first, then the names
+        starting with text, then the shortest names
+    '''
+    words = text.split()
+    if not words:
+        return []
+    kindsFilter, values = _kindsFilter(kinds)
+    pattern = text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    query = """SELECT names.name, names.kind, names.itemID
+        FROM searchNamesFTS AS fts
+        JOIN searchNames AS names ON names.nameID == fts.rowid
+        WHERE searchNamesFTS MATCH ? {}
+        ORDER BY names.name = ? COLLATE NOCASE DESC,
+            names.name LIKE ? ESCAPE '\\' DESC,
+            length(names.name), names.name
+        LIMIT ?""".format(kindsFilter)
+    match = " ".join(_quote(word) + "*" for word in words)
+    rows = EveDB.getInstance().execute(query,
+        [match] + values + [text.strip(), pattern + "%", limit]).fetchall()
+    return [(name, SEARCH_KINDS[kind], itemID) for name, kind, itemID in rows]
+
+def fuzzySearchNames(text, kinds=None, limit=10, cutoff=0.6):
+    '''Names of the map items and types close to text, typos allowed
+
+    Args:
+        text (str): The name looked for, case insensitive
+        kinds (iterable - optionnal): Restrict the search to some SEARCH_KINDS
+        limit (int - optionnal): Maximum number of results
+        cutoff (float - optionnal): Minimum similarity (0 to 1) of a result
+
+    Returns:
+        list: [(name, kind, itemID, similarity)] by decreasing similarity
+
+    Notes:
+        The FUZZY_CANDIDATES names sharing the most trigrams with text are
+        reranked with difflib. Texts shorter than a trigram are completed by
+        searchNames. Without the trigram index (SQLite < 3.34) all the names
+        are compared.
+    '''
+    from difflib import SequenceMatcher
+
+    needle = text.strip().lower()
+    if len(needle) < 3:
+        return [row + (SequenceMatcher(None, needle, row[0].lower()).ratio(),)
+            for row in searchNames(text, kinds, limit)]
+    kindsFilter, values = _kindsFilter(kinds)
+    trigrams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+    query = """SELECT names.name, names.kind, names.itemID
+        FROM searchNamesTrigram AS fts
+        JOIN searchNames AS names ON names.nameID == fts.rowid
+        WHERE searchNamesTrigram MATCH ? {}
+        ORDER BY fts.rank
+        LIMIT ?""".format(kindsFilter)
+    eveDB = EveDB.getInstance()
+    try:
+        rows = eveDB.execute(query,
+            [" OR ".join(_quote(trigram) for trigram in sorted(trigrams))]
+            + values + [FUZZY_CANDIDATES]).fetchall()
+    except sqlite3.OperationalError:
+        rows = eveDB.execute("""SELECT names.name, names.kind, names.itemID
+            FROM searchNames AS names WHERE 1 {}""".format(kindsFilter),
+            values).fetchall()
+    matcher = SequenceMatcher()
+    matcher.set_seq2(needle)
+    results = []
+    for name, kind, itemID in rows:
+        matcher.set_seq1(name.lower())
+        if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                results.append((name, SEARCH_KINDS[kind], itemID, ratio))
+    results.sort(key=lambda row: (-row[3], len(row[0]), row[0]))
+    return results[:limit]
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILERS = ("cprofile", "tracemalloc")
+TRACEMALLOC_TOP = 25
+
+
+def reportPath(gameDB, suffix = ".build.json"):
+    '''Return the path of a build report next to the game DB'''
+    return os.path.splitext(gameDB)[0] + suffix
+
+def peakRSS():
+    '''Return the peak resident memory of the process in MB, None if unknown'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # Bytes on macOS, kilobytes elsewhere
+        peak /= 1024
+    return peak / 1024
+
+def _cpuTime():
+    # CPU of the process and of its terminated children (the worker pools)
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class BuildReport():
+    '''Timings and counters of a build of the game DB
+
+    Notes:
+        Each phase records its wall and CPU time, the time spent waiting
+        for the YAML parsing (see iterate) and the rows written per table.
+        The SQL time of a phase is the rest of its wall time.
+    '''
+
+    def __init__(self):
+        self.phases = {}
+        self.rows = {}
+        self.workerParse = 0.0
+        self.extra = {}
+        self._current = None
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        '''Time a phase of the build'''
+        stats = self.phases.setdefault(name,
+            {"wall_s": 0.0, "cpu_s": 0.0, "yaml_s": 0.0})
+        previous = self._current
+        self._current = stats
+        wall = time.perf_counter()
+        cpu = _cpuTime()
+        try:
+            yield stats
+        finally:
+            stats["wall_s"] += time.perf_counter() - wall
+            stats["cpu_s"] += _cpuTime() - cpu
+            self._current = previous
+
+    def iterate(self, iterable):
+        '''Yield the items of iterable, the time spent in it is YAML time of
+        the current phase'''
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._addYaml(clock() - start)
+                return
+            self._addYaml(clock() - start)
+            yield item
+
+    def _addYaml(self, seconds):
+        if self._current is not None:
+            self._current["yaml_s"] += seconds
+
+    def addRows(self, table, count, phase = None):
+        '''Count rows written in table during phase (the table by default)'''
+        table = self.rows.setdefault(table, {"rows": 0, "phase": phase or table})
+        table["rows"] += count
+
+    def wall(self, phase):
+        return self.phases[phase]["wall_s"]
+
+    def toDict(self):
+        phases = {}
+        for name, stats in self.phases.items():
+            phases[name] = {
+                "wall_s": round(stats["wall_s"], 4),
+                "cpu_s": round(stats["cpu_s"], 4),
+                "yaml_s": round(stats["yaml_s"], 4),
+                "sql_s": round(max(0.0, stats["wall_s"] - stats["yaml_s"]), 4),
+            }
+        rows = {}
+        for table, counter in self.rows.items():
+            wall = self.phases.get(counter["phase"], {}).get("wall_s")
+            rows[table] = {
+                "rows": counter["rows"],
+                "phase": counter["phase"],
+                "rows_per_s": round(counter["rows"] / wall, 1) if wall else None,
+            }
+        report = {
+            "total_s": round(time.perf_counter() - self._start, 4),
+            "phases": phases,
+            "rows": rows,
+            "yaml_s": round(sum(stats["yaml_s"] for stats in self.phases.values()), 4),
+            "worker_parse_s": round(self.workerParse, 4),
+            "peak_rss_mb": peakRSS(),
+        }
+        report["sql_s"] = round(sum(stats["sql_s"] for stats in phases.values()), 4)
+        report.update(self.extra)
+        return report
+
+    def save(self, path):
+        with open(path, "w") as reportFile:
+            json.dump(self.toDict(), reportFile, indent=1)
+
+
+@contextmanager
+def profiled(profiler, report, gameDB):
+    '''Profile the block with cProfile or tracemalloc
+
+    Args:
+        profiler (str): One of PROFILERS, None does nothing
+        report (BuildReport): tracemalloc top allocations are added to it
+        gameDB (str): The cProfile stats are dumped next to it (.build.prof)
+    '''
+    if profiler is None:
+        yield
+    elif profiler == "cprofile":
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            path = reportPath(gameDB, ".build.prof")
+            profile.dump_stats(path)
+            report.extra["cprofile"] = os.path.basename(path)
+    elif profiler == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report.extra["tracemalloc"] = {
+                "peak_mb": round(peak / 1024 ** 2, 2),
+                "top": [{
+                        "where": str(stat.traceback),
+                        "size_kb": round(stat.size / 1024, 1),
+                        "count": stat.count,
+                    } for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]],
+            }
+    else:
+        raise ValueError("Unknown profiler {}".format(profiler))
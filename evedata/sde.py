@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+
+import yaml
+from yaml.composer import Composer
+from yaml.events import (MappingEndEvent, MappingStartEvent,
+    SequenceEndEvent, SequenceStartEvent)
+
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+# Members of the SDE archive imported in the game DB
+INV_NAMES = 'sde/bsd/invNames.yaml'
+TYPE_IDS = 'sde/fsd/typeIDs.yaml'
+UNIVERSE_PATH = 'sde/fsd/universe/eve/'
+
+
+class StreamLoader(Loader, Composer):
+    '''A YAML loader building one top-level item at a time
+
+    Args:
+        stream (file): A binary file object (i.e. a ZipFile member)
+
+    Notes:
+        The C parser does not compose partial documents, the pure Python
+        Composer is plugged on top of its events instead.
+    '''
+
+    def __init__(self, stream):
+        Loader.__init__(self, stream)
+        Composer.__init__(self)
+
+    def _constructNext(self):
+        node = self.compose_node(None, None)
+        data = self.construct_object(node, deep=True)
+        # Do not keep references on already built items
+        self.constructed_objects = {}
+        self.recursive_objects = {}
+        self.anchors = {}
+        return data
+
+    def iterItems(self):
+        '''Iterate over the top-level collection of the document
+
+        Yields:
+            (key, value) tuples for a mapping, values for a sequence.
+        '''
+        try:
+            self.get_event() # StreamStartEvent
+            self.get_event() # DocumentStartEvent
+            if self.check_event(MappingStartEvent):
+                self.get_event()
+                while not self.check_event(MappingEndEvent):
+                    key = self._constructNext()
+                    yield key, self._constructNext()
+            elif self.check_event(SequenceStartEvent):
+                self.get_event()
+                while not self.check_event(SequenceEndEvent):
+                    yield self._constructNext()
+        finally:
+            self.dispose()
+
+
+def readYaml(resourcesZip, file):
+    '''Load a whole YAML member of the SDE archive
+
+    Args:
+        resourcesZip (ZipFile): The SDE archive
+        file (str): The name of the member
+    '''
+    return yaml.load(resourcesZip.read(file), Loader = Loader)
+
+def iterYaml(resourcesZip, file):
+    '''Stream the top-level items of a YAML member of the SDE archive
+
+    Args:
+        resourcesZip (ZipFile): The SDE archive
+        file (str): The name of the member
+
+    Notes:
+        Only one item is decoded at a time, use it for the big files
+        (typeIDs.yaml, invNames.yaml).
+    '''
+    with resourcesZip.open(file) as stream:
+        yield from StreamLoader(stream).iterItems()
+
+def memberManifest(resourcesZip):
+    '''Describe the members of the SDE archive imported in the game DB
+
+    Args:
+        resourcesZip (ZipFile): The SDE archive
+
+    Returns:
+        dict: member name -> "crc32:size" read from the central directory
+    '''
+    return {
+        info.filename: "{:08x}:{}".format(info.CRC, info.file_size)
+        for info in resourcesZip.infolist()
+        if info.filename in (INV_NAMES, TYPE_IDS)
+            or info.filename.startswith(UNIVERSE_PATH)
+    }
+
+def regionDir(member):
+    '''Return the region directory of a universe member, None otherwise'''
+    if not member.startswith(UNIVERSE_PATH):
+        return None
+    return "/".join(member.split("/")[:5])
@@ -23,7 +23,7 @@ eveTables = [
                 "field_name"	VARCHAR NOT NULL,
                 "field_value"	VARCHAR,
                 PRIMARY KEY("field_name")
-        )''',
+        ) WITHOUT ROWID''',
         '''CREATE TABLE IF NOT EXISTS "invTypes" (
                 "typeID"	INTEGER NOT NULL,
                 "typeName"	VARCHAR(100),
@@ -39,7 +39,7 @@ eveTables = [
                 "toConstellationID"	INTEGER,
                 "toRegionID"	INTEGER,
                 PRIMARY KEY("fromSolarSystemID","toSolarSystemID")
-        )''',
+        ) WITHOUT ROWID''',
         '''CREATE TABLE IF NOT EXISTS "mapDenormalize" (
                 "itemID"	INTEGER NOT NULL,
                 "groupID"	INTEGER,
@@ -55,16 +55,75 @@ eveTables = [
                 "corporationID"	INTEGER,
                 PRIMARY KEY("itemID")
         )''',
-        '''CREATE TABLE IF NOT EXISTS "invNames" (
-                "itemID"	INTEGER NOT NULL,
-                "itemName"	VARCHAR(200) NOT NULL,
-                PRIMARY KEY("itemID")
-        )''',
         '''CREATE TABLE IF NOT EXISTS "mapStargates" (
                 "entranceID"	INTEGER NOT NULL,
                 "exitID"	INTEGER,
                 PRIMARY KEY("entranceID")
         )''',
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS "mapSolarSystemsRTree" USING rtree(
+                "solarSystemID",
+                "minX", "maxX",
+                "minY", "maxY",
+                "minZ", "maxZ"
+        )''',
+        '''CREATE TABLE IF NOT EXISTS "mapRegionJumps" (
+                "fromRegionID"	INTEGER NOT NULL,
+                "toRegionID"	INTEGER NOT NULL,
+                PRIMARY KEY("fromRegionID","toRegionID")
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS "mapConstellationJumps" (
+                "fromRegionID"	INTEGER,
+                "fromConstellationID"	INTEGER NOT NULL,
+                "toConstellationID"	INTEGER NOT NULL,
+                "toRegionID"	INTEGER,
+                PRIMARY KEY("fromConstellationID","toConstellationID")
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS "mapLocationStations" (
+                "locationID"	INTEGER NOT NULL,
+                "stationID"	INTEGER NOT NULL,
+                PRIMARY KEY("locationID","stationID")
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS "mapLocationCounts" (
+                "locationID"	INTEGER NOT NULL,
+                "groupID"	INTEGER NOT NULL,
+                "stations"	INTEGER NOT NULL,
+                PRIMARY KEY("locationID")
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS "searchNames" (
+                "nameID"	INTEGER NOT NULL,
+                "name"	VARCHAR(100) NOT NULL,
+                "kind"	INTEGER NOT NULL,
+                "itemID"	INTEGER NOT NULL,
+                PRIMARY KEY("nameID")
+        )''',
+        # remove_diacritics 2 needs SQLite 3.27 or later
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS "searchNamesFTS" USING fts5(
+                "name",
+                content="searchNames",
+                content_rowid="nameID",
+                tokenize="unicode61 remove_diacritics 1",
+                prefix="1 2 3"
+        )'''
+]
+
+# Fuzzy search index, the trigram tokenizer needs SQLite 3.34 or later
+searchTrigramTable = '''CREATE VIRTUAL TABLE IF NOT EXISTS "searchNamesTrigram" USING fts5(
+                "name",
+                content="searchNames",
+                content_rowid="nameID",
+                tokenize="trigram"
+        )'''
+
+
+# Only created when the names of the SDE are kept in the DB
+invNamesTable = '''CREATE TABLE IF NOT EXISTS "invNames" (
+                "itemID"	INTEGER NOT NULL,
+                "itemName"	VARCHAR(200) NOT NULL,
+                PRIMARY KEY("itemID")
+        )'''
+
+# Indexes are kept apart so they can be built once tables are populated
+eveIndexes = [
         '''CREATE INDEX IF NOT EXISTS "ix_mapDenormalize_constellationID" ON "mapDenormalize" (
                 "constellationID"
         )''',
@@ -85,5 +144,99 @@ eveTables = [
         )''',
         '''CREATE INDEX IF NOT EXISTS "ix_mapDenormalize_regionID" ON "mapDenormalize" (
                 "regionID"
+        )''',
+        '''CREATE INDEX IF NOT EXISTS "ix_mapDenormalize_itemName" ON "mapDenormalize" (
+                "itemName"
+        )''',
+        '''CREATE INDEX IF NOT EXISTS "ix_mapDenormalize_itemName_nocase" ON "mapDenormalize" (
+                "itemName" COLLATE NOCASE
+        )''',
+        '''CREATE INDEX IF NOT EXISTS "ix_invTypes_typeName_nocase" ON "invTypes" (
+                "typeName" COLLATE NOCASE
         )'''
-]
\ No newline at end of file
+]
+
+# Indexes not built in a compact DB, the stations of a location are looked up
+# in mapLocationStations
+compactSkippedIndexes = [
+        "mapDenormalize_IX_groupConstellation",
+        "mapDenormalize_IX_groupRegion",
+        "mapDenormalize_IX_groupSystem",
+]
+
+# mapJumps derived from mapStargates once mapDenormalize is populated
+mapJumpsInsert = '''INSERT INTO "mapJumps" ("fromRegionID", "fromConstellationID",
+                "fromSolarSystemID", "toSolarSystemID", "toConstellationID", "toRegionID")
+        SELECT entrance."regionID", entrance."constellationID", entrance."solarSystemID",
+                destination."solarSystemID", destination."constellationID",
+                destination."regionID"
+        FROM "mapStargates" AS stargate
+        JOIN "mapDenormalize" AS entrance ON entrance."itemID" = stargate."entranceID"
+        JOIN "mapDenormalize" AS destination ON destination."itemID" = stargate."exitID"
+'''
+
+# Adjacency and stations of the regions, constellations and systems, derived
+# once mapJumps and mapDenormalize are populated. The primary keys cover the
+# queries of evedata.queries.
+hierarchyInserts = [
+        '''INSERT INTO "mapRegionJumps" ("fromRegionID", "toRegionID")
+        SELECT DISTINCT "fromRegionID", "toRegionID"
+        FROM "mapJumps"
+        WHERE "fromRegionID" != "toRegionID"''',
+        '''INSERT INTO "mapConstellationJumps" ("fromRegionID",
+                "fromConstellationID", "toConstellationID", "toRegionID")
+        SELECT DISTINCT "fromRegionID", "fromConstellationID", "toConstellationID",
+                "toRegionID"
+        FROM "mapJumps"
+        WHERE "fromConstellationID" != "toConstellationID"''',
+        '''INSERT INTO "mapLocationStations" ("locationID", "stationID")
+        SELECT "solarSystemID", "itemID" FROM "mapDenormalize" WHERE "groupID" == 15
+        UNION ALL
+        SELECT "constellationID", "itemID" FROM "mapDenormalize" WHERE "groupID" == 15
+        UNION ALL
+        SELECT "regionID", "itemID" FROM "mapDenormalize" WHERE "groupID" == 15''',
+        '''INSERT INTO "mapLocationCounts" ("locationID", "groupID", "stations")
+        SELECT location."itemID", location."groupID", count(station."stationID")
+        FROM "mapDenormalize" AS location
+        LEFT JOIN "mapLocationStations" AS station
+                ON station."locationID" == location."itemID"
+        WHERE location."groupID" IN (3, 4, 5)
+        GROUP BY location."itemID"'''
+]
+hierarchyTables = ["mapRegionJumps", "mapConstellationJumps",
+        "mapLocationStations", "mapLocationCounts"]
+
+# Stargates leading to a stargate missing from mapDenormalize
+danglingStargates = '''SELECT stargate."entranceID", stargate."exitID"
+        FROM "mapStargates" AS stargate
+        LEFT JOIN "mapDenormalize" AS destination ON destination."itemID" = stargate."exitID"
+        WHERE destination."itemID" IS NULL
+'''
+
+# R*Tree of the solar systems coordinates, filled once mapDenormalize is populated
+spatialIndexInsert = '''INSERT INTO "mapSolarSystemsRTree"
+        SELECT "itemID", "x", "x", "y", "y", "z", "z"
+        FROM "mapDenormalize"
+        WHERE "groupID" == 5
+'''
+
+# Names of the map items and types searched by evedata.queries, filled once
+# mapDenormalize and invTypes are populated, the FTS indexes are rebuilt after.
+# kind is the index of evedata.queries.SEARCH_KINDS: region, constellation,
+# system, station, type
+searchNamesInsert = '''INSERT INTO "searchNames" ("name", "kind", "itemID")
+        SELECT "itemName",
+                CASE "groupID"
+                        WHEN 3 THEN 0
+                        WHEN 4 THEN 1
+                        WHEN 5 THEN 2
+                        ELSE 3
+                END,
+                "itemID"
+        FROM "mapDenormalize"
+        WHERE "groupID" IN (3, 4, 5, 15) AND "itemName" IS NOT NULL
+        UNION ALL
+        SELECT "typeName", 4, "typeID"
+        FROM "invTypes"
+        WHERE "typeName" IS NOT NULL
+'''
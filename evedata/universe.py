@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#======================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+#======================================================================
+
+import os
+import time
+from zipfile import ZipFile
+
+from evedata.sde import readYaml
+
+# All mapDenormalize rows are built with every column so they share the
+# same INSERT statement
+DENORMALIZE_COLUMNS = ("itemID", "groupID", "solarSystemID", "constellationID",
+    "regionID", "x", "y", "z", "itemName", "security", "factionID", "corporationID")
+STARGATES_COLUMNS = ("entranceID", "exitID")
+
+# State of the parsing process, set by initParser
+_resourcesZip = None
+_names = None
+
+
+def initParser(resourcesPath, names):
+    '''Prepare a process to parse the universe
+
+    Args:
+        resourcesPath (str): Path of the SDE archive, each process opens
+            its own handle
+        names (mapping): itemID -> itemName lookup
+    '''
+    global _resourcesZip
+    global _names
+    _resourcesZip = ZipFile(resourcesPath)
+    _names = names
+
+def _getFileList(path, zone):
+    return [x for x in _resourcesZip.namelist() if path in x and zone in x]
+
+def parseRegion(regionFile):
+    '''Parse a region with its constellations, solar systems and stations
+
+    Args:
+        regionFile (str): The region.staticdata member of the SDE archive
+
+    Returns:
+        (list, list, float): mapDenormalize rows (DENORMALIZE_COLUMNS),
+            mapStargates rows (STARGATES_COLUMNS) and the parsing time
+    '''
+    start = time.perf_counter()
+    denormalize = []
+    stargates = []
+    head, _ = os.path.split(regionFile)
+    region = readYaml(_resourcesZip, regionFile)
+    denormalize.append(
+        (region['regionID'], 3, None, None, None, region['center'][0],
+            region['center'][1], region['center'][2],
+            _names[region['regionID']], None, region.get('factionID', None), None
+        )
+    )
+    for constellationFile in _getFileList(head, 'constellation'):
+        parseConstellation(constellationFile, region, denormalize, stargates)
+    return denormalize, stargates, time.perf_counter() - start
+
+def parseConstellation(constellationFile, region, denormalize, stargates):
+    head, _ = os.path.split(constellationFile)
+    constellation = readYaml(_resourcesZip, constellationFile)
+    denormalize.append(
+        (constellation["constellationID"], 4, None, None, region['regionID'],
+            constellation['center'][0], constellation['center'][1],
+            constellation['center'][2], _names[constellation["constellationID"]],
+            None, constellation.get('factionID', region.get('factionID', None)), None
+        )
+    )
+    for systemFile in _getFileList(head, 'solarsystem'):
+        parseSolarSystem(systemFile, constellation, region, denormalize, stargates)
+
+def parseSolarSystem(systemFile, constellation, region, denormalize, stargates):
+    system = readYaml(_resourcesZip, systemFile)
+    factionID = system.get('factionID',
+        constellation.get('factionID', region.get('factionID', None)))
+    denormalize.append(
+        (system['solarSystemID'], 5, None, constellation["constellationID"],
+            region['regionID'], system['center'][0], system['center'][1],
+            system['center'][2], _names[system['solarSystemID']],
+            system['security'], factionID, None
+        )
+    )
+    for stargateID, stargateInfo in system['stargates'].items():
+        stargates.append((stargateID, stargateInfo.get('destination')))
+        denormalize.append(
+            (stargateID, 10, system["solarSystemID"],
+                constellation["constellationID"], region["regionID"],
+                None, None, None, None, None, None, None
+            )
+        )
+
+    def parseStations(stationData):
+        for stationID, stationInfo in stationData.items():
+            denormalize.append(
+                (stationID, 15, system['solarSystemID'],
+                    constellation["constellationID"], region['regionID'],
+                    stationInfo['position'][0], stationInfo['position'][1],
+                    stationInfo['position'][2], _names[stationID],
+                    system['security'], factionID, stationInfo.get('ownerID', None)
+                )
+            )
+
+    for _, planetData in system['planets'].items():
+        if 'npcStations' in planetData:
+            parseStations(planetData['npcStations'])
+        if 'moons' in planetData:
+            for _, moonData in planetData['moons'].items():
+                if 'npcStations' in moonData:
+                    parseStations(moonData['npcStations'])
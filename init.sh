@@ -17,8 +17,19 @@ git config --global user.email "$GH_USER_EMAIL"
 git config --global user.name "$GH_USER_NAME"
 git remote add origin-ssh git@github.com:$GH_REPO
 mkdir -p resources
-python3 db_create.py
-git add resources/eve.db
+# The incremental DB is kept in the Travis cache, the committed eve.db is
+# the one of the artifact, without the state of the incremental builds
+dbcache="$HOME/.cache/pytt"
+if [ -f "$dbcache/eve.db" ]
+then
+    cp "$dbcache/eve.db" resources/eve.db
+fi
+python3 db_create.py --incremental --artifact
+mkdir -p "$dbcache"
+cp resources/eve.db "$dbcache/eve.db"
+python3 -m evedata.artifact resources/eve.db.xz resources/eve.db
+git rm --cached --quiet --ignore-unmatch resources/eve.jumps.npy resources/eve.jumps.json
+git add resources/eve.db resources/eve.db.xz resources/eve.db.xz.json resources/eve.jumps.npy.xz
 echo $resstamp > version
 git add version
 git commit -m "Up to date DB with SDE $resstamp"
@@ -19,23 +19,179 @@
 # along with pytt.  If not, see <http://www.gnu.org/licenses/>.
 # ==============================================================================
 
+import os
 import sqlite3
+import threading
+import time
+import weakref
+from functools import lru_cache
+from itertools import chain, islice
+
+
+@lru_cache(maxsize=None)
+def _insertQuery(table, columns, keys = None):
+    '''Build the INSERT statement of a table (cached)
+
+    Args:
+        table (str): The name of the table
+        columns (tuple): The columns where values will be inserted
+        keys (tuple - optionnal): The keys of dict values, positional
+            parameters are used otherwise
+    '''
+    query = "INSERT INTO {} ({}) ".format(
+        table,
+        ", ".join(columns),
+    )
+    if keys:
+        query += "VALUES ({})".format(", ".join([":" + x for x in keys]))
+    else:
+        query += "VALUES ({})".format(", ".join(("?",) * len(columns)))
+    return query
+
+
+@lru_cache(maxsize=256)
+def _selectQuery(table, columns, where = None):
+    '''Build the SELECT statement of a table (cached)
+
+    Args:
+        table (str): The name of the table, see QueryDB.select
+        columns (tuple): The columns selected
+        where (str or tuple - optionnal): A complete search condition or
+            the columns of the conditions, values are bound with ?
+    '''
+    query = "SELECT "
+    if "^" in table:
+        query = "SELECT DISTINCT "
+        table = table[1:]
+    query += "{} FROM {}".format(", ".join(columns), table)
+    if type(where) is str:
+        query += " WHERE {}".format(where)
+    elif where:
+        conditions = []
+        for column in where:
+            sign = "=="
+            if "!" in column:
+                sign = "!="
+                column = column[1:]
+            conditions.append("{} {} ?".format(column, sign))
+        query += " WHERE {}".format(" AND ".join(conditions))
+    return query
+
+
+# How connections read the DB: through the page cache of SQLite (default),
+# a memory map of the whole file shared with the other processes by the OS
+# (mmap) or a private copy loaded in memory (memory)
+SERVING_MODES = ("default", "mmap", "memory")
+
+
+def _readOnlyURI(path):
+    # urllib.request is slow to import, only load it when needed
+    from urllib.request import pathname2url
+
+    # The file must not change while it is open
+    return "file:{}?mode=ro&immutable=1".format(pathname2url(os.path.abspath(path)))
+
+
+class FetchedRows():
+    '''The result of a query run with hooks, its rows are already fetched
+
+    Notes:
+        Behaves like the sqlite3.Cursor it replaces for reading rows.
+    '''
+
+    def __init__(self, cursor, rows):
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        self._rows = iter(rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def __next__(self):
+        return next(self._rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size = 1):
+        return list(islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
 
 
 class QueryDB():
     '''A class helper.
 
     Args:
-        gameDB (str): A string representing the path of the DB to use."
+        readOnly (bool - optionnal): Open the DB read-only and immutable,
+            the connection can then be used from any thread
+        mode (str - optionnal): One of SERVING_MODES
+
+    Notes:
+        DBPath is the path of the DB to use.
+        In memory mode the changes are not written back to DBPath.
+        Hooks (see addHook) are called after each query of every
+        connection.
     '''
 
     DBPath = None
+    # Size of the prepared statements cache of the connection
+    cachedStatements = 256
+    hooks = []
+
+    @classmethod
+    def addHook(cls, hook):
+        '''Call hook(queryDB, query, values, seconds, rows) after each query
+
+        Args:
+            hook (callable): Gets the QueryDB, the SQL statement, its
+                parameters, its duration and the number of rows returned
+                (affected for the statements without result)
+
+        Notes:
+            The rows of a SELECT are fetched at once, within the duration,
+            execute() then returns a FetchedRows instead of the cursor.
+        '''
+        QueryDB.hooks.append(hook)
 
-    def __init__(self):
-        self.connection = sqlite3.connect(self.DBPath)
+    @classmethod
+    def removeHook(cls, hook):
+        QueryDB.hooks.remove(hook)
+
+    def __init__(self, readOnly = False, mode = "default"):
+        if mode not in SERVING_MODES:
+            raise ValueError("Unknown serving mode {}".format(mode))
+        self.readOnly = readOnly
+        self.mode = mode
+        if mode == "memory":
+            self.connection = self._loadInMemory()
+        elif readOnly:
+            self.connection = sqlite3.connect(_readOnlyURI(self.DBPath), uri=True,
+                cached_statements=self.cachedStatements, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(self.DBPath,
+                cached_statements=self.cachedStatements)
+        if mode == "mmap":
+            # The whole file, pages are then read from the OS page cache
+            self.connection.execute("PRAGMA mmap_size = {}".format(
+                max(os.path.getsize(self.DBPath), 1)))
         self.connection.row_factory = sqlite3.Row
         self.cursor = self.connection.cursor()
 
+    def _loadInMemory(self):
+        # Copy of the DB in a private in-memory DB
+        memory = sqlite3.connect(":memory:",
+            cached_statements=self.cachedStatements,
+            check_same_thread=not self.readOnly)
+        source = sqlite3.connect(_readOnlyURI(self.DBPath), uri=True)
+        try:
+            source.backup(memory)
+        finally:
+            source.close()
+        return memory
+
     def execute(self, query, values = None):
         '''Execute a query
 
@@ -46,9 +202,26 @@ class QueryDB():
         Notes:
             See [sqlite3.Cursor.execute](https://docs.python.org/3.7/library/sqlite3.html#sqlite3.Cursor.execute)
         '''
+        if QueryDB.hooks:
+            return self._executeHooked(query, values)
         if values:
             return self.cursor.execute(query, values)
         return self.cursor.execute(query)
+
+    def _executeHooked(self, query, values):
+        start = time.perf_counter()
+        cursor = self.cursor.execute(query, values or ())
+        if cursor.description is None:
+            result = cursor
+            rows = cursor.rowcount
+        else:
+            fetched = cursor.fetchall()
+            result = FetchedRows(cursor, fetched)
+            rows = len(fetched)
+        seconds = time.perf_counter() - start
+        for hook in list(QueryDB.hooks):
+            hook(self, query, values, seconds, rows)
+        return result
     
     def executemany(self, query, values):
         '''Execute a query
@@ -59,8 +232,16 @@ class QueryDB():
         
         Notes:
             See [sqlite3.Cursor.executemany](https://docs.python.org/3.7/library/sqlite3.html#sqlite3.Cursor.executemany)
+            Hooks get None as parameters.
         '''
+        if not QueryDB.hooks:
+            self.cursor.executemany(query, values)
+            return
+        start = time.perf_counter()
         self.cursor.executemany(query, values)
+        seconds = time.perf_counter() - start
+        for hook in list(QueryDB.hooks):
+            hook(self, query, None, seconds, self.cursor.rowcount)
         
     def create(self, query):
         '''Create tables in the DB
@@ -87,16 +268,8 @@ class QueryDB():
             ("column",) otherwise it will be taken as a string.
 
         '''
-        query = "INSERT INTO {} ({}) ".format(
-            table,
-            ", ".join(columns),
-        )
-        if type(values) is dict:
-            keys = values.keys()
-            query += "VALUES ({})".format(", ".join([":" + x for x in keys]))
-        else:
-            query += "VALUES ({})".format(", ".join(("?",) * len(values)))
-        self.execute(query, values)
+        keys = tuple(values.keys()) if type(values) is dict else None
+        self.execute(_insertQuery(table, tuple(columns), keys), values)
     
     def insertmany(self, table, columns, values):
         '''Insert values in a table (insert iterable)
@@ -108,18 +281,17 @@ class QueryDB():
 
         Notes:
             The iterable of values could be provided as list/tuple or dict.
+            It can be a generator, it is consumed while inserting.
 
         '''
-        query = "INSERT INTO {} ({}) ".format(
-            table,
-            ", ".join(columns),
+        values = iter(values)
+        first = next(values, None)
+        if first is None:
+            return
+        keys = tuple(first.keys()) if type(first) is dict else None
+        self.executemany(_insertQuery(table, tuple(columns), keys),
+            chain((first,), values)
         )
-        if type(values[0]) is dict:
-            keys = values[0].keys()
-            query += "VALUES ({})".format(", ".join([":" + x for x in keys]))
-        else:
-            query += "VALUES ({})".format(", ".join(("?",) * len(columns)))
-        self.executemany(query , values)
 
     def select(self, table, columns = "*", where = None):
         '''Select values in a table
@@ -132,41 +304,41 @@ class QueryDB():
                 the format of "column == 'value'"
                 or dict {column: value} for multiple AND condition
                 if the column begin with ! the condition change from == to !=
+                Values of a dict are bound as parameters.
 
         Notes:
             If one column is provided, do not forget a comma at the end
             ("column",) otherwise it will be taken as a string.
         '''
-        query = "SELECT "
-        if "^" in table:
-            query = "SELECT DISTINCT "
-            table = table[1:]
-        if where:
-            if type(where) is str:
-                # Can not use ? in first WHERE statement, so using Python format
-                query += "{} FROM {} WHERE {}".format(
-                    ", ".join(columns),
-                    table,
-                    where
-                )
-            elif type(where) is dict:
-                query += "{} FROM {} WHERE ".format(
-                    ", ".join(columns),
-                    table
-                )
-                for column, value in where.items():
-                    sign = "=="
-                    if "!" in column:
-                        sign = "!="
-                        column = column[1:]
-                    query += "{} {} '{}' AND ".format(column, sign, value)
-                query = query[:-5]
-        else:
-            query += "{} FROM {}".format(
-                ", ".join(columns),
-                table)
-        return self.execute(query)
+        if type(where) is dict:
+            query = _selectQuery(table, tuple(columns), tuple(where.keys()))
+            return self.execute(query, tuple(where.values()))
+        return self.execute(_selectQuery(table, tuple(columns), where))
     
+    def selectin(self, table, columns, column, values, where = None, chunkSize = 500):
+        '''Select the rows of a table matching a list of values
+
+        Args:
+            table (str): The name of the table, see select
+            columns (iterable): An iterable of columns where values will be selected
+            column (str): The column matched against values
+            values (iterable): The values looked for, one query is run per
+                chunk of values
+            where (dict - optionnal): Additional {column: value} conditions
+            chunkSize (int - optionnal): Number of values bound per query
+
+        Yields:
+            The matching rows, in no particular order
+        '''
+        values = list(dict.fromkeys(values))
+        conditions = list((where or {}).keys())
+        for start in range(0, len(values), chunkSize):
+            chunk = values[start:start + chunkSize]
+            condition = " AND ".join(["{} == ?".format(x) for x in conditions]
+                + ["{} IN ({})".format(column, ", ".join(("?",) * len(chunk)))])
+            yield from self.execute(_selectQuery(table, tuple(columns), condition),
+                tuple((where or {}).values()) + tuple(chunk))
+
     def selectone(self, table, columns = "*", where = None):
         return self.select(table, columns, where).fetchone()
 
@@ -198,26 +370,146 @@ class QueryDB():
         '''
         self.connection.close()
 
+class BulkInsert():
+    '''Buffer rows per table and insert them by chunks
+
+    Args:
+        queryDB (QueryDB): The DB where rows are inserted
+        chunkSize (int - optionnal): Number of rows buffered per table
+            before being flushed with executemany
+
+    Notes:
+        Rows are buffered per (table, columns), so rows of a table must
+        use the same columns to be grouped in the same executemany.
+        Call flush() before reading back a table.
+    '''
+
+    chunkSize = 5000
+
+    def __init__(self, queryDB, chunkSize = None):
+        self.queryDB = queryDB
+        if chunkSize:
+            self.chunkSize = chunkSize
+        self.buffers = {}
+
+    def add(self, table, columns, values):
+        '''Buffer a row, see QueryDB.insert'''
+        key = (table, tuple(columns))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = []
+        buffer.append(values)
+        if len(buffer) >= self.chunkSize:
+            self._flush(key)
+
+    def _flush(self, key):
+        buffer = self.buffers.pop(key, None)
+        if buffer:
+            self.queryDB.insertmany(key[0], key[1], buffer)
+
+    def flush(self, table = None):
+        '''Insert the buffered rows
+
+        Args:
+            table (str - optionnal): Only flush this table
+        '''
+        for key in list(self.buffers):
+            if table is None or key[0] == table:
+                self._flush(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.flush()
+
+
 class EveDB(QueryDB):
+    '''The game DB
+
+    Notes:
+        getInstance() returns a process-wide read-write connection, after
+        setReadOnly() each thread gets its own read-only connection (and
+        cursor) so queries can be served concurrently.
+        setServingMode() chooses how the next connections read the DB.
+    '''
 
     __instance = None
+    __readOnly = False
+    __mode = "default"
+    __local = threading.local()
+    __readers = weakref.WeakSet()
 
     @classmethod
     def getInstance(cls):
+        if cls.__readOnly:
+            instance = getattr(cls.__local, "instance", None)
+            if instance is None:
+                instance = cls.__local.instance = EveDB(True, cls.__mode)
+                cls.__readers.add(instance)
+            return instance
         if cls.__instance is None:
-            cls.__instance = EveDB()
+            cls.__instance = EveDB(False, cls.__mode)
         return cls.__instance
     
     @classmethod
     def reset(cls):
         cls.__instance = None
 
-    def __init__(self):
+    @classmethod
+    def setReadOnly(cls, readOnly = True):
+        '''Switch between the shared read-write and per thread read-only
+        connections
+
+        Args:
+            readOnly (bool - optionnal): Use read-only connections
+        '''
+        cls.closeReaders()
+        cls.__readOnly = readOnly
+
+    @classmethod
+    def setServingMode(cls, mode = "mmap"):
+        '''Choose how the DB is read, the open connections are closed
+
+        Args:
+            mode (str - optionnal): One of SERVING_MODES. "mmap" maps the
+                whole file so its pages are shared by all the processes
+                through the OS page cache, "memory" loads a private copy
+                of the DB in each connection (one per thread with
+                setReadOnly()) for the lowest latency.
+        '''
+        if mode not in SERVING_MODES:
+            raise ValueError("Unknown serving mode {}".format(mode))
+        cls.closeReaders()
+        if cls.__instance is not None:
+            cls.__instance.close()
+        cls.__mode = mode
+
+    @classmethod
+    def closeReaders(cls):
+        '''Close the read-only connections of all threads'''
+        for reader in list(cls.__readers):
+            reader.close()
+        cls.__local = threading.local()
+
+    def __init__(self, readOnly = False, mode = "default"):
         from config import getGameDB
         self.DBPath = getGameDB()
-        super().__init__()
+        super().__init__(readOnly, mode)
+
+    def dumpTime(self):
+        '''Return the dump_time of the SDE the DB was built from, None when
+        it was not recorded'''
+        row = self.selectone("metadata", ("field_value",), {"field_name": "dump_time"})
+        return int(row[0]) if row else None
     
     def close(self):
         super().close()
-        # When closing reset instance to avoid Error
-        self.reset()
+        if self.readOnly:
+            self.__readers.discard(self)
+            if getattr(self.__local, "instance", None) is self:
+                del self.__local.instance
+        else:
+            # When closing reset instance to avoid Error
+            self.reset()
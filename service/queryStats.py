@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# ==============================================================================
+# Copyright (C) 2020 Damien Psolyca Gaignon
+#
+# This file is part of pytt.
+#
+# pytt is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pytt is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pytt.  If not, see <http://www.gnu.org/licenses/>.
+# ==============================================================================
+
+import threading
+from collections import deque
+
+from service.queryDB import QueryDB
+
+# Statements which get a plan when they are slow
+PLANNED_STATEMENTS = ("SELECT", "WITH")
+
+
+class QueryStats():
+    '''Statistics of the queries run through QueryDB
+
+    Args:
+        slowThreshold (float - optionnal): Queries lasting longer (seconds)
+            are logged with their EXPLAIN QUERY PLAN, none by default
+        samples (int - optionnal): Durations kept per statement for the
+            percentiles
+        slowQueries (int - optionnal): Slow queries kept in the snapshot
+        echo (bool - optionnal): Print the slow queries
+
+    Notes:
+        install() registers the statistics as a QueryDB hook, the
+        statistics are also a context manager doing install/uninstall.
+    '''
+
+    def __init__(self, slowThreshold = None, samples = 1000, slowQueries = 100,
+            echo = True):
+        self.slowThreshold = slowThreshold
+        self.samples = samples
+        self.echo = echo
+        self.statements = {}
+        self.slow = deque(maxlen=slowQueries)
+        self._lock = threading.Lock()
+
+    def install(self):
+        QueryDB.addHook(self.record)
+        return self
+
+    def uninstall(self):
+        QueryDB.removeHook(self.record)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.uninstall()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.slow.clear()
+
+    def record(self, queryDB, query, values, seconds, rows):
+        '''The QueryDB hook'''
+        with self._lock:
+            stats = self.statements.get(query)
+            if stats is None:
+                stats = self.statements[query] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "rows": 0,
+                    "durations": deque(maxlen=self.samples),
+                }
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["rows"] += max(rows, 0)
+            stats["durations"].append(seconds)
+        if self.slowThreshold is not None and seconds > self.slowThreshold:
+            self._logSlow(queryDB, query, values, seconds, rows)
+
+    def _logSlow(self, queryDB, query, values, seconds, rows):
+        plan = None
+        if query.lstrip().upper().startswith(PLANNED_STATEMENTS):
+            # A cursor of its own, the one of queryDB may still be read
+            plan = [row[-1] for row in queryDB.connection.execute(
+                "EXPLAIN QUERY PLAN " + query, values or ())]
+        entry = {
+            "query": query,
+            "values": list(values) if values is not None else None,
+            "seconds": seconds,
+            "rows": rows,
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow.append(entry)
+        if self.echo:
+            print("Slow query ({:.1f} ms, {} rows) : {}".format(
+                seconds * 1000, rows, " ".join(query.split())))
+            for step in plan or ():
+                print("    {}".format(step))
+
+    def snapshot(self):
+        '''Return the statistics as a dict
+
+        Returns:
+            dict: "statements" with, per SQL statement, its count, rows,
+            total time and mean/p50/p99/max latencies in microseconds, the
+            totals and the "slow" queries with their plan
+        '''
+        with self._lock:
+            statements = {}
+            for query, stats in self.statements.items():
+                durations = sorted(stats["durations"])
+                statements[query] = {
+                    "count": stats["count"],
+                    "rows": stats["rows"],
+                    "total_s": round(stats["total"], 6),
+                    "mean_us": round(stats["total"] / stats["count"] * 1e6, 2),
+                    "p50_us": round(_percentile(durations, 50) * 1e6, 2),
+                    "p99_us": round(_percentile(durations, 99) * 1e6, 2),
+                    "max_us": round(stats["max"] * 1e6, 2),
+                }
+            return {
+                "queries": sum(stats["count"] for stats in statements.values()),
+                "total_s": round(sum(stats["total_s"] for stats in statements.values()), 6),
+                "statements": statements,
+                "slow": list(self.slow),
+            }
+
+
+def _percentile(durations, percent):
+    return durations[min(len(durations) - 1, int(len(durations) * percent / 100))]